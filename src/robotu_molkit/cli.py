@@ -11,14 +11,24 @@ from robotu_molkit.constants import (
     DEFAULT_CONCURRENCY,
     DEFAULT_EMBED_MODEL_ID,
     DEFAULT_WATSONX_AI_URL,
-    FAST_EMBED_MODEL_ID
+    EMBED_BATCH_SIZE,
+    EMBED_MAX_CONCURRENCY,
+    SUMMARY_MAX_CONCURRENCY,
+    FAST_EMBED_MODEL_ID,
+    LOCAL_EMBED_MODEL_ID
 )
-from robotu_molkit.ingest.workers import run as _run_workers
 from robotu_molkit.config import load_credentials
-from robotu_molkit.vector.watsonx_index import WatsonxIndex
 
 CONFIG_PATH = Path.home() / ".config" / "molkit" / "config.json"
 
+def _loop_factory():
+    """Return uvloop's loop constructor when installed, else None (default loop)."""
+    try:
+        import uvloop
+    except ImportError:
+        return None
+    return uvloop.new_event_loop
+
 # Main CLI with overall description
 desc = "Download and parse molecules from PubChem."
 app = typer.Typer(help=desc, add_completion=False)
@@ -45,22 +55,38 @@ def ingest(
     raw_dir: Path = typer.Option(DEFAULT_RAW_DIR, "--raw-dir", "-r", help="Directory to save raw JSON files"),
     parsed_dir: Path = typer.Option(DEFAULT_PARSED_DIR, "--parsed-dir", "-p", help="Directory to save parsed payloads"),
     concurrency: int = typer.Option(DEFAULT_CONCURRENCY, "--concurrency", "-c", help="Number of concurrent workers"),
+    force: bool = typer.Option(False, "--force", help="Re-process CIDs already parsed and re-download cached records (skipped if unchanged per ETag)"),
+    pretty: bool = typer.Option(False, "--pretty", help="Indent parsed JSON for human inspection (larger files)"),
+    skip_view: bool = typer.Option(False, "--skip-view", help="Skip PUG-View annotations (safety, thermo, spectra, ontology); structure and properties only"),
   ):
     """
     Fetch CID(s) from PubChem, save raw JSON and parsed Molecule payloads.
     """
     cids = cids or []
     if file:
-        file_cids = [int(line.strip()) for line in file.read_text().splitlines() if line.strip()]
-        cids = file_cids + cids
+        lines = [line.strip() for line in file.read_text().splitlines() if line.strip()]
+        bad = [line for line in lines if not line.isdigit()]
+        if bad:
+            typer.secho(f"⚠️ Skipping {len(bad)} invalid CID line(s): {', '.join(bad[:5])}",
+                        err=True, fg=typer.colors.YELLOW)
+        cids = [int(line) for line in lines if line.isdigit()] + cids
+    # Drop duplicates and non-positive ids before spending any request budget
+    cids = sorted({cid for cid in cids if cid > 0})
     if not cids:
         typer.secho("❌ No CIDs provided", err=True, fg=typer.colors.RED)
         raise typer.Exit(code=1)
 
+    # Deferred: pulls in RDKit, which would otherwise slow every command (even --help)
+    from robotu_molkit.ingest.workers import run as _run_workers
+
     logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
     logging.info("Starting ingest of %d CIDs...", len(cids))
     try:
-        asyncio.run(_run_workers(cids, raw_dir, parsed_dir, concurrency))
+        with asyncio.Runner(loop_factory=_loop_factory()) as runner:
+            # Python 3.12+: tasks that finish without suspending (cache hits) skip a loop iteration
+            if hasattr(asyncio, "eager_task_factory"):
+                runner.get_loop().set_task_factory(asyncio.eager_task_factory)
+            runner.run(_run_workers(cids, raw_dir, parsed_dir, concurrency, force, pretty, not skip_view))
     except KeyboardInterrupt:
         typer.secho("⚠️ Ingest interrupted by user", err=True, fg=typer.colors.YELLOW)
         raise typer.Exit(code=1)
@@ -85,6 +111,10 @@ def embed_command(
         False, "--fast",
         help="Shortcut for granite-embedding-107m-multilingual."
     ),
+    backend: str = typer.Option(
+        "watsonx", "--backend",
+        help="Embedding backend: watsonx, or fastembed to embed locally (pip install robotu-molkit[local])."
+    ),
     api_key: Optional[str] = typer.Option(
         None, "--watsonx-api-key", "-k",
         help="IBM Watsonx API Key (override config/env var)."
@@ -97,6 +127,22 @@ def embed_command(
         DEFAULT_WATSONX_AI_URL, "--watsonx-url",
         help="IBM Watsonx inference URL."
     ),
+    batch_size: int = typer.Option(
+        EMBED_BATCH_SIZE, "--batch-size",
+        help="Summaries sent per embedding request."
+    ),
+    max_concurrency: int = typer.Option(
+        EMBED_MAX_CONCURRENCY, "--max-concurrency",
+        help="Embedding requests in flight at once."
+    ),
+    summary_concurrency: int = typer.Option(
+        SUMMARY_MAX_CONCURRENCY, "--summary-concurrency",
+        help="Granite summary requests in flight at once."
+    ),
+    refresh: bool = typer.Option(
+        False, "--refresh",
+        help="Regenerate summaries even where a saved one is newer than the parsed JSON."
+    ),
 ):
     """
     Generate a single “general” summary and embedding for **every** parsed
@@ -115,6 +161,12 @@ def embed_command(
 
     if fast:
         model = FAST_EMBED_MODEL_ID
+    elif backend == "fastembed" and model == DEFAULT_EMBED_MODEL_ID:
+        # The Granite embedding models are watsonx-only
+        model = LOCAL_EMBED_MODEL_ID
+
+    # Deferred: pulls in ibm_watsonx_ai, only needed by this command
+    from robotu_molkit.vector.watsonx_index import WatsonxIndex
 
     typer.echo(f"Embedding model: {model}")
     idx = WatsonxIndex(
@@ -122,9 +174,14 @@ def embed_command(
         project_id=project_id,
         model=model,
         ibm_url=ibm_url,
+        backend=backend,
     )
 
-    jsonl_path = idx.ingest_folder(parsed_dir=parsed_dir, out_dir=out_dir)
+    jsonl_path = idx.ingest_folder(
+        parsed_dir=parsed_dir, out_dir=out_dir,
+        batch_size=batch_size, max_concurrency=max_concurrency,
+        summary_concurrency=summary_concurrency, reuse_summaries=not refresh,
+    )
     typer.secho(f"✅  Embeddings written to {jsonl_path}", fg=typer.colors.GREEN)
 
 
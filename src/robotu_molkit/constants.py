@@ -3,9 +3,16 @@ from pathlib import Path
 MAX_RPS = 5
 MAX_RPM = 400
 TIMEOUT_S = 30
+MAX_RETRIES = 3
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+MAX_RETRY_AFTER_S = 60  # upper bound on a server-requested Retry-After wait
 DEFAULT_RAW_DIR = Path("data/downloaded_data")
 DEFAULT_PARSED_DIR = Path("data/parsed")
 DEFAULT_CONCURRENCY = 5
+FAILED_CIDS_FILE = "failed_cids.txt"  # written to PARSED_DIR for easy re-runs
+BATCH_SIZE = 100  # CIDs per multi-CID PUG-REST request
+IO_WORKERS = 4    # threads for disk reads/writes, independent of network concurrency
+STREAM_CHUNK_BYTES = 64 * 1024
 
 # Lista de endpoints
 RECORD_API   = "https://pubchem.ncbi.nlm.nih.gov/rest/pug/compound/cid/{cid}/record/JSON?record_type=3d"
@@ -17,6 +24,16 @@ PROPERTIES_API = (
 PUG_VIEW_API = "https://pubchem.ncbi.nlm.nih.gov/rest/pug_view/data/compound/{cid}/JSON"
 DEFAULT_EMBED_MODEL_ID = "ibm/granite-embedding-278m-multilingual"
 FAST_EMBED_MODEL_ID = "ibm/granite-embedding-107m-multilingual"
+LOCAL_EMBED_MODEL_ID = "BAAI/bge-small-en-v1.5"  # default for the fastembed backend
+EMBED_BATCH_SIZE = 64  # summaries per watsonx embedding request
+EMBED_MAX_CONCURRENCY = 2  # embedding batches in flight during `molkit embed`
+SUMMARY_MAX_CONCURRENCY = 8  # Granite summary requests in flight during `molkit embed`
+EMBED_CACHE_SIZE = 256  # single-query embeddings kept in memory per client
+HNSW_M = 32  # graph neighbours per node for index_type="hnsw"
+IVF_NPROBE = 16  # inverted lists scanned per query for index_type="ivfpq"
+IVF_TRAIN_SIZE = 50_000  # vectors used to train the IVF-PQ quantizers
+FILTER_EXACT_MAX = 10_000  # filtered searches selecting at most this many rows scan them exhaustively
 DEFAULT_WATSONX_AI_URL = "https://us-south.ml.cloud.ibm.com"
 DEFAULT_WATSONX_GENERATIVE_MODEL = "ibm/granite-3-8b-instruct"
-DEFAULT_JSONL_FILE_ROUTE = "data/vectors/watsonx_vectors.jsonl"
\ No newline at end of file
+DEFAULT_JSONL_FILE_ROUTE = "data/vectors/watsonx_vectors.jsonl"
+CACHE_DIR = Path.home() / ".cache" / "molkit"
\ No newline at end of file
@@ -1,32 +1,159 @@
 # ingest/api_clients.py
+import asyncio
 import aiohttp
 import logging
-from typing import Any, Dict, Optional
+import math
+import os
+import random
+import time
+from concurrent.futures import Executor
+from datetime import timezone
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, TypeVar
 from aiolimiter import AsyncLimiter
+import orjson
 
-from robotu_molkit.constants import RECORD_API, SYNONYMS_API, PROPERTIES_API, PUG_VIEW_API, MAX_RPS, MAX_RPM, TIMEOUT_S
+from robotu_molkit.constants import RECORD_API, SYNONYMS_API, PROPERTIES_API, PUG_VIEW_API, MAX_RPS, MAX_RPM, MAX_RETRIES, MAX_RETRY_AFTER_S, RETRY_STATUSES, STREAM_CHUNK_BYTES
 
-async def _get_json(
-    session: aiohttp.ClientSession, url: str,
-    sec_lim: AsyncLimiter, min_lim: AsyncLimiter
-) -> Optional[Dict[str, Any]]:
+T = TypeVar("T")
+
+def make_limiter() -> AsyncLimiter:
+    """
+    Single admission limiter honouring both PubChem caps.
+
+    5 req/s already implies 300 req/min (< 400), so one bucket at the tighter
+    rate replaces nested per-second/per-minute limiters, which could hold a
+    token in one while stalling on the other.
+    """
+    return AsyncLimiter(min(MAX_RPS, MAX_RPM / 60), 1)
+
+async def _read_json(r: aiohttp.ClientResponse) -> Dict[str, Any]:
+    # orjson is several times faster than aiohttp's stdlib-backed r.json()
+    # on multi-MB PUG-View payloads
+    return orjson.loads(await r.read())
+
+async def _request(
+    session: aiohttp.ClientSession, url: str, limiter: AsyncLimiter,
+    consume: Callable[[aiohttp.ClientResponse], Awaitable[T]] = _read_json,
+    headers: Optional[Dict[str, str]] = None,
+) -> T:
+    """
+    GET *url* and hand the response to *consume*, retrying transient failures
+    with jittered exponential backoff.
+
+    Throttling (429), gateway/server errors and dropped connections are retried
+    up to MAX_RETRIES times, honouring Retry-After when the server sends one.
+    The session is created with ``raise_for_status=True``; any other error
+    (e.g. 404 for an unknown CID) propagates immediately to the caller, which
+    owns logging.
+    """
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            async with limiter:
+                async with session.get(url, headers=headers) as r:
+                    return await consume(r)
+        except aiohttp.ClientResponseError as e:
+            if e.status not in RETRY_STATUSES or attempt == MAX_RETRIES:
+                raise
+            delay = _retry_after((e.headers or {}).get("Retry-After"))
+            if delay is None:
+                delay = 2 ** attempt + random.random()
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+            if attempt == MAX_RETRIES:
+                raise
+            delay = 2 ** attempt + random.random()
+        logging.info("Transient error on %s; retry %d/%d in %.1fs", url, attempt + 1, MAX_RETRIES, delay)
+        await asyncio.sleep(delay)
+
+def _retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Seconds to wait from a Retry-After header, given either as delay-seconds or
+    as an HTTP-date (RFC 9110), capped at MAX_RETRY_AFTER_S; None if absent or
+    unparseable.
+    """
+    if not value:
+        return None
     try:
-        async with sec_lim, min_lim:
-            async with session.get(url) as r:
-                r.raise_for_status()
-                return await r.json()
-    except Exception as e:
-        logging.warning("Error fetching %s: %s", url, e)
+        delay = float(value)
+    except ValueError:
+        try:
+            when = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if when.tzinfo is None:  # "-0000" zone: the date is still UTC
+            when = when.replace(tzinfo=timezone.utc)
+        delay = when.timestamp() - time.time()
+    if math.isnan(delay):
         return None
+    return min(max(delay, 0.0), MAX_RETRY_AFTER_S)
+
+async def _download(
+    url: str, session, limiter, dest: Path, io_pool: Optional[Executor] = None
+) -> bool:
+    """
+    Stream *url* straight into *dest* in fixed-size chunks, so memory stays
+    bounded by STREAM_CHUNK_BYTES regardless of payload size. The body is
+    written to a temporary sibling and atomically renamed on success.
+
+    When *dest* already exists with a stored ETag, the request is
+    conditional: a 304 leaves the cached file untouched. Returns True if new
+    content was written.
+    """
+    loop = asyncio.get_running_loop()
+    tmp = dest.with_name(dest.name + ".tmp")
+    etag_path = dest.with_suffix(".etag")
+    etag = await loop.run_in_executor(io_pool, _read_etag, dest, etag_path)
+    headers = {"If-None-Match": etag} if etag else None
+
+    async def stream(r: aiohttp.ClientResponse) -> bool:
+        if r.status == 304:
+            return False
+        f = await loop.run_in_executor(io_pool, tmp.open, "wb")
+        try:
+            async for chunk in r.content.iter_chunked(STREAM_CHUNK_BYTES):
+                await loop.run_in_executor(io_pool, f.write, chunk)
+        finally:
+            await loop.run_in_executor(io_pool, f.close)
+        await loop.run_in_executor(io_pool, _commit, tmp, dest, etag_path, r.headers.get("ETag"))
+        return True
+
+    return await _request(session, url, limiter, stream, headers)
+
+async def fetch_record(
+    cid: str, session, limiter, dest: Path, io_pool: Optional[Executor] = None
+) -> bool:
+    """Download the 3D record into *dest* (see _download)."""
+    return await _download(RECORD_API.format(cid=cid), session, limiter, dest, io_pool)
+
+def _read_etag(dest: Path, etag_path: Path) -> Optional[str]:
+    if dest.exists() and etag_path.exists():
+        return etag_path.read_text().strip() or None
+    return None
 
-async def fetch_record(cid: str, session, sec_lim, min_lim):
-    return await _get_json(session, RECORD_API.format(cid=cid), sec_lim, min_lim)
+def _commit(tmp: Path, dest: Path, etag_path: Path, etag: Optional[str]) -> None:
+    """Move a fully written download into place and record (or clear) its ETag."""
+    os.replace(tmp, dest)
+    if etag:
+        etag_path.write_text(etag)
+    else:
+        etag_path.unlink(missing_ok=True)
 
-async def fetch_synonyms(cid: str, session, sec_lim, min_lim):
-    return await _get_json(session, SYNONYMS_API.format(cid=cid), sec_lim, min_lim)
+async def fetch_synonyms(cids: List[int], session, limiter) -> Dict[int, Dict[str, Any]]:
+    """Fetch synonyms for a batch of CIDs in one request, keyed by CID."""
+    data = await _request(session, SYNONYMS_API.format(cid=",".join(map(str, cids))), limiter)
+    entries = data.get("InformationList", {}).get("Information", [])
+    # Re-wrap each entry so it matches the single-CID response shape
+    return {int(e["CID"]): {"InformationList": {"Information": [e]}} for e in entries if "CID" in e}
 
-async def fetch_properties(cid: str, session, sec_lim, min_lim):
-    return await _get_json(session, PROPERTIES_API.format(cid=cid), sec_lim, min_lim)
+async def fetch_properties(cids: List[int], session, limiter) -> Dict[int, Dict[str, Any]]:
+    """Fetch computed properties for a batch of CIDs in one request, keyed by CID."""
+    data = await _request(session, PROPERTIES_API.format(cid=",".join(map(str, cids))), limiter)
+    entries = data.get("PropertyTable", {}).get("Properties", [])
+    return {int(e["CID"]): {"PropertyTable": {"Properties": [e]}} for e in entries if "CID" in e}
 
-async def fetch_view(cid: str, session, sec_lim, min_lim):
-    return await _get_json(session, PUG_VIEW_API.format(cid=cid), sec_lim, min_lim)
+async def fetch_view(
+    cid: str, session, limiter, dest: Path, io_pool: Optional[Executor] = None
+) -> bool:
+    """Download the PUG-View annotations into *dest* (see _download)."""
+    return await _download(PUG_VIEW_API.format(cid=cid), session, limiter, dest, io_pool)
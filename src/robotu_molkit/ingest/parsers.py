@@ -19,20 +19,24 @@ Requirements:
 import logging
 import re
 import datetime
-import json
-from typing import Any, Dict, List, Optional, Tuple
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, Optional, Tuple, Union
 from pathlib import Path
 import numpy as np
 
-import requests
 
 # RDKit availability flag and imports
 try:
-    from rdkit import Chem, DataStructs
-    from rdkit.Chem import AllChem, MACCSkeys, Descriptors
+    from rdkit import Chem
+    from rdkit.Chem import MACCSkeys, Descriptors, rdFingerprintGenerator
     from rdkit.Chem import rdMolDescriptors as rdDesc
     from rdkit import RDLogger
     RDLogger.DisableLog('rdApp.*')
+    # Built once and reused: bit-identical to GetMorganFingerprintAsBitVect(radius=2, nBits=1024)
+    _MORGAN_GEN = rdFingerprintGenerator.GetMorganGenerator(radius=2, fpSize=1024)
+    # SMARTS for the chem-tag fallback heuristics, compiled once
+    _SMARTS_ORGANOPHOSPHATE = Chem.MolFromSmarts("P(=O)(O)O")
+    _SMARTS_HALO_AROMATIC = Chem.MolFromSmarts("c1ccccc1F")
     RDKit_OK = True
 except Exception as e:
     logging.warning(
@@ -40,19 +44,20 @@ except Exception as e:
     )
     RDKit_OK = False
 
-# ESOL solubility estimator: calculates logS from SMILES
+# ESOL solubility estimator: calculates logS from a molecule or SMILES
 if RDKit_OK:
-    def esol_logS(smiles: str) -> float:
+    def esol_logS(mol: Union["Chem.Mol", str]) -> float:
         """
         Estimate aqueous solubility (logS) using the ESOL method:
           logS = 0.16 - 0.63*logP - 0.0062*MW + 0.066*RB - 0.74*aromatic_fraction
 
         Parameters:
-            smiles (str): Canonical SMILES string.
+            mol (Chem.Mol | str): Parsed RDKit molecule (preferred, avoids
+                re-parsing) or canonical SMILES string.
         Returns:
             float: Predicted log10(solubility) in mol/L.
         """
-        m = Chem.MolFromSmiles(smiles)
+        m = Chem.MolFromSmiles(mol) if isinstance(mol, str) else mol
         logP = Descriptors.MolLogP(m)
         mw   = Descriptors.MolWt(m)
         rb   = Descriptors.NumRotatableBonds(m)
@@ -62,10 +67,16 @@ if RDKit_OK:
 # pKa predictions disabled (no supported model)
 PKA_OK = False
 
+# Shared read-only defaults for .get() chains over PubChem JSON, so lookups of
+# missing keys don't allocate a fresh {} / [] each time. Never returned to callers.
+_EMPTY: Mapping[str, Any] = MappingProxyType({})
+_EMPTY_SEQ: Tuple[Any, ...] = ()
+_EMPTY_ROWS: Tuple[Mapping[str, Any], ...] = (_EMPTY,)
+
 
 def find_section(sections: List[Dict[str, Any]], heading: str) -> Dict[str, Any]:
     """
-    Recursively search a list of PubChem 'Section' dicts for a TOCHeading.
+    Search a tree of PubChem 'Section' dicts (depth-first) for a TOCHeading.
 
     Parameters:
         sections (List[Dict[str, Any]]): List of section dictionaries.
@@ -73,15 +84,33 @@ def find_section(sections: List[Dict[str, Any]], heading: str) -> Dict[str, Any]
     Returns:
         Dict[str, Any]: The matching section dict, or empty dict if not found.
     """
-    for sec in sections:
+    stack = list(reversed(sections))
+    while stack:
+        sec = stack.pop()
         if sec.get("TOCHeading") == heading:
             return sec
-        nested = find_section(sec.get("Section", []), heading)
-        if nested:
-            return nested
+        stack.extend(reversed(sec.get("Section", _EMPTY_SEQ)))
     return {}
 
 
+def index_sections(sections: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Map every TOCHeading in a section tree to its section in a single walk.
+
+    The first match in depth-first order wins, as with find_section, so
+    ``index_sections(secs).get(h, {})`` equals ``find_section(secs, h)``.
+    """
+    index: Dict[str, Dict[str, Any]] = {}
+    stack = list(reversed(sections))
+    while stack:
+        sec = stack.pop()
+        heading = sec.get("TOCHeading")
+        if heading is not None:
+            index.setdefault(heading, sec)
+        stack.extend(reversed(sec.get("Section", _EMPTY_SEQ)))
+    return index
+
+
 def _extract_number(info: List[Dict[str, Any]], key: str) -> Optional[float]:
     """
     Find a numeric value by its label in a PubChem 'Information' list.
@@ -94,7 +123,7 @@ def _extract_number(info: List[Dict[str, Any]], key: str) -> Optional[float]:
     """
     for entry in info:
         if entry.get("Name") == key:
-            num = entry.get("Value", {}).get("Number")
+            num = entry.get("Value", _EMPTY).get("Number")
             if isinstance(num, dict):
                 return num.get("Value")
     return None
@@ -104,7 +133,8 @@ _H_RX = re.compile(r"\b(H\d{3})(?!\+)\s*\((\d+(?:\.\d+)?)%\)")
 
 def extract_h_codes(
     view_secs: List[Dict[str, Any]],
-    min_pct: float = 10.0
+    min_pct: float = 10.0,
+    index: Optional[Dict[str, Dict[str, Any]]] = None,
 ) -> List[str]:
     """
     Extract GHS H-codes with notification percentages above a threshold.
@@ -112,23 +142,25 @@ def extract_h_codes(
     Parameters:
         view_secs (List[Dict[str, Any]]): Sections from PUG-View 'Record'.
         min_pct (float): Minimum percentage to include a code.
+        index (Optional[Dict]): Prebuilt index_sections(view_secs), if available.
     Returns:
         List[str]: Sorted unique list of H-codes (e.g. ['H302', 'H314']).
     """
-    ghs = find_section(view_secs, "GHS Classification")
+    ghs = index.get("GHS Classification", _EMPTY) if index is not None else find_section(view_secs, "GHS Classification")
     if not ghs:
         return []
 
     codes: set[str] = set()
-    for info in ghs.get("Information", []):
+    for info in ghs.get("Information", _EMPTY_SEQ):
         if info.get("Name") != "GHS Hazard Statements":
             continue
         text = " ".join(
             part.get("String", "")
-            for part in info.get("Value", {}).get("StringWithMarkup", [])
+            for part in info.get("Value", _EMPTY).get("StringWithMarkup", _EMPTY_SEQ)
         )
         for h_code, pct in _H_RX.findall(text):
-            if float(pct) >= min_pct:
+            # The same code recurs across notifier entries: skip the parse once accepted
+            if h_code not in codes and float(pct) >= min_pct:
                 codes.add(h_code)
     return sorted(codes)
 
@@ -140,7 +172,7 @@ def _collect_strings(value: Dict[str, Any]) -> List[str]:
     Handles both 'StringWithMarkup' lists and direct 'String' fields.
     """
     out: List[str] = []
-    for sm in value.get("StringWithMarkup", []):
+    for sm in value.get("StringWithMarkup", _EMPTY_SEQ):
         s = sm.get("String")
         if s:
             out.append(s)
@@ -150,6 +182,18 @@ def _collect_strings(value: Dict[str, Any]) -> List[str]:
     return out
 
 
+# Ontology term cleanup and extraction patterns
+_IN_WHICH_RX = re.compile(r"\bin which\b")
+_CLAUSE_RX = re.compile(r"\b(?:that|which|with)\b")
+_TRAILING_CONJ_RX = re.compile(r"\b(and|or)$")
+_ARTICLE_PHRASE_RX = re.compile(r"\b(?:a|an)\s+([^.,;]{1,60})")
+_IS_A_RX = re.compile(r"\bis a\s+([a-z][^.;]{1,40})", re.I)
+_LEADING_ARTICLE_RX = re.compile(r"^(?:a|an)\s+", re.I)
+# CAS registry numbers among synonyms, e.g. 58-08-2
+_CAS_RX = re.compile(r"\d+-\d+-\d+")
+# Ontology trees of drugs can hold hundreds of terms; only the leading ones are used
+_MAX_ONTOLOGY_TERMS = 32
+
 def _clean_term(term: str) -> str:
     """
     Normalize an ontology term by removing extraneous clauses and punctuation.
@@ -161,9 +205,9 @@ def _clean_term(term: str) -> str:
     """
     term = term.lower().strip()
     term = term.split('(')[0]
-    term = re.split(r"\bin which\b", term)[0]
-    term = re.split(r"\b(?:that|which|with)\b", term)[0]
-    return re.sub(r"\b(and|or)$", "", term).strip(",;. ")
+    term = _IN_WHICH_RX.split(term)[0]
+    term = _CLAUSE_RX.split(term)[0]
+    return _TRAILING_CONJ_RX.sub("", term).strip(",;. ")
 
 
 def _walk_information(node: Dict[str, Any]) -> List[Dict[str, Any]]:
@@ -174,11 +218,14 @@ def _walk_information(node: Dict[str, Any]) -> List[Dict[str, Any]]:
         if "Information" in node:
             for inf in node["Information"]:
                 yield inf
-        for sub in node.get("Section", []):
+        for sub in node.get("Section", _EMPTY_SEQ):
             yield from _walk_information(sub)
 
 
-def extract_ontology_terms(view: Dict[str, Any]) -> List[str]:
+def extract_ontology_terms(
+    view: Dict[str, Any],
+    index: Optional[Dict[str, Dict[str, Any]]] = None,
+) -> List[str]:
     """
     Extract and clean ontology terms from PUG-View JSON.
 
@@ -186,44 +233,53 @@ def extract_ontology_terms(view: Dict[str, Any]) -> List[str]:
     2) If empty, fallback to 'Record Description' → 'Ontology Summary'.
     3) Deduplicate, preserve insertion order, filter noise.
 
+    The Ontology walk stops once _MAX_ONTOLOGY_TERMS unique terms are found.
+
+    Pass a prebuilt index_sections() of the view's sections as *index* to
+    skip re-walking the tree.
+
     Returns:
         List[str]: Cleaned ontology terms.
     """
-    secs = view.get("Record", {}).get("Section", [])
+    if index is None:
+        index = index_sections(view.get("Record", _EMPTY).get("Section", _EMPTY_SEQ))
     seen: set[str] = set()
     terms: List[str] = []
 
     # Preferred 'Ontology' section
-    onto = find_section(secs, "Ontology")
+    onto = index.get("Ontology", _EMPTY)
     if onto:
+        # _walk_information is lazy: leaving the loop stops the tree walk too
         for info in _walk_information(onto):
-            for raw in _collect_strings(info.get("Value", {})): 
+            for raw in _collect_strings(info.get("Value", _EMPTY)): 
                 t = _clean_term(raw)
                 if t and t not in seen:
                     seen.add(t); terms.append(t)
+            if len(terms) >= _MAX_ONTOLOGY_TERMS:
+                break
 
     # Fallback to descriptive summary
     if not terms:
-        desc = find_section(secs, "Record Description")
-        for info in desc.get("Information", []):
+        desc = index.get("Record Description", _EMPTY)
+        for info in desc.get("Information", _EMPTY_SEQ):
             desc_txt = str(info.get("Description", "")).lower()
             if not desc_txt.startswith("ontology"): continue
-            for blob in _collect_strings(info.get("Value", {})):
+            for blob in _collect_strings(info.get("Value", _EMPTY)):
                 # Capture phrases after 'a/an'
-                for raw in re.findall(r"\b(?:a|an)\s+([^.,;]{1,60})", blob):
+                for raw in _ARTICLE_PHRASE_RX.findall(blob):
                     if "ec" in raw.lower(): continue
                     t = _clean_term(raw)
                     if t and t not in seen and len(t.split())<=5:
                         seen.add(t); terms.append(t)
                 # Capture 'is a <class>' patterns
-                for raw in re.findall(r"\bis a\s+([a-z][^.;]{1,40})", blob, flags=re.I):
+                for raw in _IS_A_RX.findall(blob):
                     t = _clean_term(raw)
                     if t and "trimethylxanthine" in t:
                         seen.add(t); terms.insert(0, t)
     return list(dict.fromkeys(terms))
 
 
-def _derive_chem_tag(smiles: str, ontology: List[str]) -> str:
+def _derive_chem_tag(mol: Optional["Chem.Mol"], ontology: List[str]) -> str:
     """
     Derive a simple chemical classification tag.
 
@@ -241,7 +297,7 @@ def _derive_chem_tag(smiles: str, ontology: List[str]) -> str:
         for tag in unique:
             for sub in tag.split(" and "):
                 # remove leading 'a ' or 'an '
-                clean = re.sub(r'^(?:a|an)\s+', "", sub.strip(), flags=re.I)
+                clean = _LEADING_ARTICLE_RX.sub("", sub.strip())
                 parts.append(clean)
         # 3) re-dedupe
         parts = list(dict.fromkeys(parts))
@@ -249,17 +305,22 @@ def _derive_chem_tag(smiles: str, ontology: List[str]) -> str:
         return ", ".join(parts[:2])
 
     # fallback to SMARTS heuristics
-    m = Chem.MolFromSmiles(smiles) if RDKit_OK else None
-    if m:
-        if m.HasSubstructMatch(Chem.MolFromSmarts("P(=O)(O)O")):
+    m = mol
+    if m is not None:
+        if m.HasSubstructMatch(_SMARTS_ORGANOPHOSPHATE):
             return "organophosphate"
-        if m.HasSubstructMatch(Chem.MolFromSmarts("c1ccccc1F")):
+        if m.HasSubstructMatch(_SMARTS_HALO_AROMATIC):
             return "halogenated aromatic"
         if all(atom.GetAtomicNum() in (6,1) for atom in m.GetAtoms()):
             return "hydrocarbon"
     return "unclassified compound"
 
 
+def utc_timestamp() -> str:
+    """Current UTC time as ISO-8601 with a 'Z' suffix, e.g. '2025-05-01T12:00:00Z'."""
+    return datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds").replace("+00:00", "Z")
+
+
 def build_parsed(
     raw: Dict[str, Any],
     synonyms: Optional[Dict[str, Any]],
@@ -267,6 +328,7 @@ def build_parsed(
     view: Optional[Dict[str, Any]],
     cid: int,
     raw_path: Path,
+    fetched_at: Optional[str] = None,
 ) -> Dict[str, Any]:
     """
     Parse a PubChem compound record into a standardized Molecule JSON ready for downstream processing.
@@ -281,6 +343,8 @@ def build_parsed(
         view (Optional[Dict[str, Any]]): Full Record section from PUG-View for enriched annotations.
         cid (int): PubChem Compound ID for this molecule.
         raw_path (Path): Filesystem path to the cached raw JSON file.
+        fetched_at (Optional[str]): ISO-8601 UTC fetch time; pass one value for a whole
+            ingest run to avoid formatting it per CID. Defaults to now.
 
     Returns:
         Dict[str, Any]: A dictionary conforming to the Molecule JSON schema, containing:
@@ -306,22 +370,22 @@ def build_parsed(
 
     # Handle PUG-View Record format
     if raw.get("Record"):
-        sections = {sec.get("TOCHeading"): sec for sec in raw["Record"].get("Section", [])}
-        info3d = sections.get("3D Conformer", {}).get("Information", [])
+        sections = {sec.get("TOCHeading"): sec for sec in raw["Record"].get("Section", _EMPTY_SEQ)}
+        info3d = sections.get("3D Conformer", _EMPTY).get("Information", _EMPTY_SEQ)
         if info3d:
             conformer = info3d[0]["Value"]["Conformer3D"]
-            xyz = [(c["X"], c["Y"], c["Z"]) for c in conformer.get("Coordinates", [])]
+            xyz = [(c["X"], c["Y"], c["Z"]) for c in conformer.get("Coordinates", _EMPTY_SEQ)]
             atom_symbols = conformer.get("Atoms")
     # Handle PUG-REST PC_Compounds format
     elif raw.get("PC_Compounds"):
         compound = raw["PC_Compounds"][0]
-        elements = compound.get("atoms", {}).get("element", [])
-        coords_list = compound.get("coords", [])
+        elements = compound.get("atoms", _EMPTY).get("element", _EMPTY_SEQ)
+        coords_list = compound.get("coords", _EMPTY_SEQ)
         if coords_list:
-            coords = coords_list[0].get("conformers", [])
+            coords = coords_list[0].get("conformers", _EMPTY_SEQ)
             if coords:
                 c = coords[0]
-                xs, ys, zs = c.get("x", []), c.get("y", []), c.get("z", [])
+                xs, ys, zs = c.get("x", _EMPTY_SEQ), c.get("y", _EMPTY_SEQ), c.get("z", _EMPTY_SEQ)
                 xyz = list(zip(xs, ys, zs))
                 # Derive atom symbols either via RDKit or fallback integers
                 if RDKit_OK:
@@ -333,9 +397,9 @@ def build_parsed(
                 else:
                     atom_symbols = [str(el) for el in elements]
         # Parse bond connectivity if available
-        aid1 = compound.get("bonds", {}).get("aid1", [])
-        aid2 = compound.get("bonds", {}).get("aid2", [])
-        orders = compound.get("bonds", {}).get("order", [])
+        aid1 = compound.get("bonds", _EMPTY).get("aid1", _EMPTY_SEQ)
+        aid2 = compound.get("bonds", _EMPTY).get("aid2", _EMPTY_SEQ)
+        orders = compound.get("bonds", _EMPTY).get("order", _EMPTY_SEQ)
         if aid1 and aid2 and orders:
             bond_orders = list(zip(aid1, aid2, orders))
 
@@ -346,15 +410,20 @@ def build_parsed(
     # --------------------------------------------------
     # 2) Extract basic computed properties
     # --------------------------------------------------
-    props_entry = props.get("PropertyTable", {}).get("Properties", [{}])[0] if props else {}
+    props_entry = props.get("PropertyTable", _EMPTY).get("Properties", _EMPTY_ROWS)[0] if props else {}
     smiles = props_entry.get("CanonicalSMILES")
     logp = props_entry.get("XLogP")
     formal_charge = props_entry.get("Charge")
 
+    # Parse the SMILES once; ESOL, fingerprints, descriptors and tagging share it
+    mol = Chem.MolFromSmiles(smiles) if RDKit_OK and smiles else None
+    if smiles and RDKit_OK and mol is None:
+        logging.warning("RDKit could not parse SMILES for CID %s: %s", cid, smiles)
+
     # --------------------------------------------------
     # 3) Predict solubility (ESOL method via RDKit)
     # --------------------------------------------------
-    logs = esol_logS(smiles) if RDKit_OK and smiles else None
+    logs = esol_logS(mol) if mol is not None else None
 
     # pKa prediction is disabled by default.
     # It's crucial for understanding ionization, solubility, and bioavailability,
@@ -364,9 +433,11 @@ def build_parsed(
     # --------------------------------------------------
     # 4) Helper to query PUG-View sections
     # --------------------------------------------------
-    view_sections = view.get("Record", {}).get("Section", []) if view else []
+    view_sections = view.get("Record", _EMPTY).get("Section", _EMPTY_SEQ) if view else []
+    # One walk of the tree serves every heading lookup below
+    view_index = index_sections(view_sections)
     def get_info(heading: str) -> List[Dict[str, Any]]:
-        return find_section(view_sections, heading).get("Information", [])
+        return view_index.get(heading, _EMPTY).get("Information", _EMPTY_SEQ)
 
     # 4-a) Thermodynamic properties
     thermo_info = get_info("Thermodynamics")
@@ -375,12 +446,12 @@ def build_parsed(
     heat_capacity = _extract_number(get_info("Heat Capacity"), "Heat Capacity")
 
     # 4-b) Safety data (GHS codes, flash point, LD50)
-    ghs_codes = extract_h_codes(view_sections)
+    ghs_codes = extract_h_codes(view_sections, index=view_index)
     flash = _extract_number(get_info("Physical Properties"), "Flash Point")
     ld50 = _extract_number(get_info("Toxicity"), "LD50")
 
     # 4-c) Spectral information
-    spectral_sections = find_section(view_sections, "Spectral Information").get("Section", [])
+    spectral_sections = view_index.get("Spectral Information", _EMPTY).get("Section", _EMPTY_SEQ)
     
     _heading_map = {
         "Raman spectra available": "Raman",
@@ -397,26 +468,24 @@ def build_parsed(
     # --------------------------------------------------
     # 5) Extract synonyms and preferred names
     # --------------------------------------------------
-    raw_syns = synonyms.get("InformationList", {}).get("Information", [{}])[0].get("Synonym", []) if synonyms else []
+    raw_syns = synonyms.get("InformationList", _EMPTY).get("Information", _EMPTY_ROWS)[0].get("Synonym", []) if synonyms else []
     preferred_name = raw_syns[0] if raw_syns else None
-    cas_like = next((s for s in raw_syns if re.fullmatch(r"\d+-\d+-\d+", s)), None)
+    cas_like = next((s for s in raw_syns if _CAS_RX.fullmatch(s)), None)
 
     # --------------------------------------------------
     # 6) Generate molecular fingerprints
     # --------------------------------------------------
     ecfp = maccs = None
-    if RDKit_OK and smiles:
+    if mol is not None:
         try:
-            mol = Chem.MolFromSmiles(smiles)
-            # ECFP: 1024-bit binary fingerprint
-            bv = AllChem.GetMorganFingerprintAsBitVect(mol, radius=2, nBits=1024)
-            ecfp_array = np.zeros((1024,), dtype=int)
-            DataStructs.ConvertToNumpyArray(bv, ecfp_array)
-            ecfp = ecfp_array.tolist()
-
-            # MACCS: optional, keep as on-bit indices
+            # ECFP: 1024-bit fingerprint, packed MSB-first and hex-encoded (256 chars)
+            ecfp = np.packbits(_MORGAN_GEN.GetFingerprintAsNumPy(mol)).tobytes().hex()
+
+            # MACCS: 167 keys, packed the same way
             maccs_bv = MACCSkeys.GenMACCSKeys(mol)
-            maccs = list(maccs_bv.GetOnBits())
+            maccs_bits = np.zeros(maccs_bv.GetNumBits(), dtype=np.uint8)
+            maccs_bits[list(maccs_bv.GetOnBits())] = 1
+            maccs = np.packbits(maccs_bits).tobytes().hex()
         except Exception as e:
             logging.warning("Fingerprint generation failed for CID %s: %s", cid, e)
 
@@ -436,9 +505,8 @@ def build_parsed(
     fsp3          = None
     bertz_ct      = None
 
-    if RDKit_OK and smiles:
+    if mol is not None:
         try:
-            mol = Chem.MolFromSmiles(smiles)
             # molecular formula & weight
             formula       = rdDesc.CalcMolFormula(mol)
             mw            = Descriptors.MolWt(mol)
@@ -465,8 +533,8 @@ def build_parsed(
     # --------------------------------------------------
     # 8) Ontology term extraction and chemical tagging
     # --------------------------------------------------
-    ontology_terms = extract_ontology_terms(view) if view else []
-    chem_tag = _derive_chem_tag(smiles, ontology_terms)
+    ontology_terms = extract_ontology_terms(view, view_index) if view else []
+    chem_tag = _derive_chem_tag(mol, ontology_terms)
 
     # --------------------------------------------------
     # 9) Final assembly into Molecule JSON
@@ -523,14 +591,12 @@ def build_parsed(
             "synonyms": raw_syns,
         },
         "meta": {
-            "fetched": datetime.datetime.utcnow().isoformat() + "Z",
+            "fetched": fetched_at or utc_timestamp(),
             "source": "PubChem",
-            "source_version": raw.get("Record", {}).get("RecordMetadata", {}).get("ReleaseDate"),
+            "source_version": raw.get("Record", _EMPTY).get("RecordMetadata", _EMPTY).get("ReleaseDate"),
             "cache_path": str(raw_path),
             "ontology": ontology_terms,
             "chem_tag": chem_tag,
         },
     }
-    print(f"Procesado registro CID {cid}")
-
     return molecule
@@ -1,83 +1,224 @@
 # ingest/workers.py
-import asyncio, json, logging
+import asyncio, logging, multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
-from typing import List
+from typing import Any, Awaitable, Callable, Dict, List, Optional
 from aiolimiter import AsyncLimiter
 import aiohttp
+import orjson
 
-from robotu_molkit.constants import MAX_RPS, MAX_RPM, TIMEOUT_S, DEFAULT_RAW_DIR, DEFAULT_PARSED_DIR
+from robotu_molkit.constants import TIMEOUT_S, DEFAULT_RAW_DIR, DEFAULT_PARSED_DIR, BATCH_SIZE, IO_WORKERS, FAILED_CIDS_FILE
+from robotu_molkit.utils.utils import chunked
 
-from .api_clients import fetch_record, fetch_synonyms, fetch_properties, fetch_view
-from .parsers import build_parsed
-from ibm_watsonx_ai.foundation_models import Embeddings
-import re
+from .api_clients import make_limiter, fetch_record, fetch_synonyms, fetch_properties, fetch_view
+from .parsers import build_parsed, utc_timestamp
 
 async def process_cid(
     cid: int,
     session: aiohttp.ClientSession,
     raw_dir: Path,
     parsed_dir: Path,
-    sec_limiter: AsyncLimiter,
-    min_limiter: AsyncLimiter,
+    limiter: AsyncLimiter,
+    syn: Optional[Dict[str, Any]] = None,
+    props: Optional[Dict[str, Any]] = None,
+    force: bool = False,
+    io_pool: Optional[Executor] = None,
+    cpu_pool: Optional[Executor] = None,
+    pretty: bool = False,
+    fetched_at: Optional[str] = None,
+    with_view: bool = True,
 ) -> None:
     raw_path = raw_dir / f"pubchem_{cid}_raw.json"
-    parsed_path = parsed_dir / f"pubchem_{cid}.json"
+    # Without PUG-View, only structure and PUG-REST properties are parsed
+    view_path = raw_dir / f"pubchem_{cid}_view.json" if with_view else None
+    parsed_path = _parsed_path(parsed_dir, cid)
 
-    raw = await fetch_record(cid, session, sec_limiter, min_limiter)
-    if not raw:
-        return
-    raw_path.write_text(json.dumps(raw, indent=2))
+    # Record and PUG-View are independent: keep both in flight, the limiter paces them
+    fetches = [_ensure_cached(fetch_record, cid, session, raw_path, limiter, force, io_pool)]
+    if view_path is not None:
+        fetches.append(_ensure_cached(fetch_view, cid, session, view_path, limiter, force, io_pool))
+    record_result, *view_result = await asyncio.gather(*fetches, return_exceptions=True)
+    if isinstance(record_result, BaseException):
+        raise record_result
+    # PUG-View is optional enrichment: without it the record is still parsed,
+    # falling back to a previously downloaded copy if one exists
+    if view_result and isinstance(view_result[0], BaseException):
+        if isinstance(view_result[0], asyncio.CancelledError):
+            raise view_result[0]
+        err = view_result[0]
+        logging.warning("PUG-View unavailable for CID %s (%s: %s); parsing without it", cid, type(err).__name__, err)
+        if not _is_nonempty(view_path):
+            view_path = None
 
-    syn  = await fetch_synonyms(cid, session, sec_limiter, min_limiter)
-    props= await fetch_properties(cid, session, sec_limiter, min_limiter)
-    view = await fetch_view(cid, session, sec_limiter, min_limiter)
+    # Decoding, RDKit work and serialisation are CPU-bound: run them off the event loop
+    await asyncio.get_running_loop().run_in_executor(
+        cpu_pool, _parse_to_disk, raw_path, view_path, parsed_path, syn, props, int(cid), pretty, fetched_at
+    )
 
-    parsed = build_parsed(raw, syn, props, view, int(cid), raw_path)
-    parsed_path.write_text(json.dumps(parsed, indent=2))
+async def _ensure_cached(
+    fetch: Callable[..., Awaitable[bool]],
+    cid: int,
+    session: aiohttp.ClientSession,
+    path: Path,
+    limiter: AsyncLimiter,
+    force: bool,
+    io_pool: Optional[Executor],
+) -> None:
+    # Reuse the payload from a previous run unless a refresh is forced;
+    # forced refreshes are conditional on the stored ETag.
+    # PubChem already sends valid JSON: it is streamed to disk as-is.
+    if force or not _is_nonempty(path):
+        await fetch(cid, session, limiter, path, io_pool)
 
-async def worker(
-    queue: asyncio.Queue,
+async def _lookup_one(
+    fetch: Callable[..., Awaitable[Dict[int, Dict[str, Any]]]],
+    cid: int,
     session: aiohttp.ClientSession,
-    raw_dir: Path,
-    parsed_dir: Path,
-    sec_limiter: AsyncLimiter,
-    min_limiter: AsyncLimiter,
+    limiter: AsyncLimiter,
+) -> Optional[Dict[str, Any]]:
+    """
+    Single-CID synonyms/properties lookup. PubChem answers 404 when it has no
+    such data for the CID: that yields None, as a missing entry in a batch
+    response does. Other errors (already retried) propagate.
+    """
+    try:
+        return (await fetch([cid], session, limiter)).get(int(cid))
+    except aiohttp.ClientResponseError as e:
+        if e.status != 404:
+            raise
+        logging.warning("No %s data for CID %s (404)", fetch.__name__.removeprefix("fetch_"), cid)
+        return None
+
+def _parsed_path(parsed_dir: Path, cid: int) -> Path:
+    return parsed_dir / f"pubchem_{cid}.json"
+
+def _is_nonempty(path: Path) -> bool:
+    return path.exists() and path.stat().st_size > 0
+
+def _parse_to_disk(
+    raw_path: Path,
+    view_path: Optional[Path],
+    parsed_path: Path,
+    syn: Optional[Dict[str, Any]],
+    props: Optional[Dict[str, Any]],
+    cid: int,
+    pretty: bool = False,
+    fetched_at: Optional[str] = None,
 ) -> None:
-    while True:
-        cid = await queue.get()
-        if cid is None:
-            queue.task_done()
-            break
-        try:
-            await process_cid(cid, session, raw_dir, parsed_dir, sec_limiter, min_limiter)
-        except Exception as e:
-            logging.error("Error processing CID %s: %s", cid, e)
-        finally:
-            queue.task_done()
+    """Decode, parse and write one record; runs in a worker process."""
+    view = _read_json(view_path) if view_path is not None else None
+    parsed = build_parsed(_read_json(raw_path), syn, props, view, cid, raw_path, fetched_at)
+    _write_json(parsed_path, parsed, pretty)
+
+def _read_json(path: Path) -> Dict[str, Any]:
+    return orjson.loads(path.read_bytes())
+
+def _write_json(path: Path, obj: Dict[str, Any], pretty: bool = False) -> None:
+    # Compact by default: indenting roughly triples fingerprint-heavy files
+    path.write_bytes(orjson.dumps(obj, option=orjson.OPT_INDENT_2 if pretty else None))
+
+class _Progress:
+    """Completion counter bumped as each CID finishes."""
+
+    def __init__(self, total: int) -> None:
+        self.total = total
+        self.done = 0
+        self.failed: List[int] = []
+
+    def update(self, cid: int, ok: bool = True) -> None:
+        self.done += 1
+        if ok:
+            logging.info("[%d/%d] Processed CID %s", self.done, self.total, cid)
+        else:
+            self.failed.append(cid)
+            logging.info("[%d/%d] Failed CID %s", self.done, self.total, cid)
 
 async def run(
     cids: List[int],
     raw_dir: Path,
     parsed_dir: Path,
     concurrency: int,
+    force: bool = False,
+    pretty: bool = False,
+    with_view: bool = True,
 ) -> None:
     raw_dir.mkdir(parents=True, exist_ok=True)
     parsed_dir.mkdir(parents=True, exist_ok=True)
 
-    queue: asyncio.Queue = asyncio.Queue()
-    for cid in cids:
-        queue.put_nowait(cid)
-    for _ in range(concurrency):
-        queue.put_nowait(None)
+    # Resume: CIDs parsed by an earlier run are skipped unless a refresh is forced
+    if not force:
+        todo = [cid for cid in cids if not _is_nonempty(_parsed_path(parsed_dir, cid))]
+        if len(todo) < len(cids):
+            logging.info("Skipping %d CID(s) already parsed in %s", len(cids) - len(todo), parsed_dir)
+        cids = todo
+
+    sem = asyncio.Semaphore(concurrency)
+    progress = _Progress(len(cids))
+    fetched_at = utc_timestamp()  # one timestamp for the whole run
 
-    sec_limiter = AsyncLimiter(MAX_RPS, 1)
-    min_limiter = AsyncLimiter(MAX_RPM, 60)
+    limiter = make_limiter()
     timeout = aiohttp.ClientTimeout(total=TIMEOUT_S)
-    async with aiohttp.ClientSession(timeout=timeout) as session:
-        tasks = [asyncio.create_task(worker(
-            queue, session, raw_dir, parsed_dir, sec_limiter, min_limiter
-        )) for _ in range(concurrency)]
-        await queue.join()
-        for t in tasks:
-            t.cancel()
-        await asyncio.gather(*tasks, return_exceptions=True)
\ No newline at end of file
+    # PubChem is a single host: keep connections alive and cache its DNS entry
+    connector = aiohttp.TCPConnector(
+        limit=concurrency,
+        limit_per_host=concurrency,
+        ttl_dns_cache=600,
+        keepalive_timeout=75,
+        enable_cleanup_closed=True,
+    )
+    headers = {"Accept-Encoding": "gzip", "Connection": "keep-alive"}
+    # The io_pool threads are already running when parse workers start, so do
+    # not fork: forkserver (spawn on Windows) starts them from a clean process
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    with ThreadPoolExecutor(max_workers=IO_WORKERS) as io_pool, \
+            ProcessPoolExecutor(mp_context=multiprocessing.get_context(method)) as cpu_pool:
+        async with aiohttp.ClientSession(
+            connector=connector, timeout=timeout, headers=headers, raise_for_status=True
+        ) as session:
+            async def bounded(
+                cid: int, syn: Optional[Dict[str, Any]], props: Optional[Dict[str, Any]], lookup: bool = False,
+            ) -> None:
+                async with sem:
+                    try:
+                        if lookup:
+                            # The batch lookup failed: retry it for this CID alone
+                            syn = await _lookup_one(fetch_synonyms, cid, session, limiter)
+                            props = await _lookup_one(fetch_properties, cid, session, limiter)
+                        await process_cid(
+                            cid, session, raw_dir, parsed_dir, limiter,
+                            syn, props, force, io_pool, cpu_pool, pretty, fetched_at, with_view,
+                        )
+                    except Exception as e:
+                        logging.error("Error processing CID %s: %s", cid, e)
+                        progress.update(cid, ok=False)
+                    else:
+                        progress.update(cid)
+
+            tasks: List[asyncio.Task] = []
+            # Synonyms and properties come from multi-CID endpoints: one request per batch
+            for batch in chunked(cids, BATCH_SIZE):
+                try:
+                    syn_map = await fetch_synonyms(batch, session, limiter)
+                    props_map = await fetch_properties(batch, session, limiter)
+                except Exception as e:
+                    logging.warning(
+                        "Batch lookup failed for CIDs %s..%s (%s); retrying per CID", batch[0], batch[-1], e
+                    )
+                    tasks.extend(asyncio.create_task(bounded(cid, None, None, lookup=True)) for cid in batch)
+                    continue
+                tasks.extend(
+                    asyncio.create_task(bounded(cid, syn_map.get(int(cid)), props_map.get(int(cid))))
+                    for cid in batch
+                )
+            await asyncio.gather(*tasks)
+
+    failed_path = parsed_dir / FAILED_CIDS_FILE
+    if not progress.failed:
+        # A clean run must not leave an earlier run's list behind
+        failed_path.unlink(missing_ok=True)
+    else:
+        failed_path.write_text("".join(f"{cid}\n" for cid in sorted(progress.failed)))
+        logging.warning(
+            "%d CID(s) failed; re-run them with: molkit ingest --file %s",
+            len(progress.failed), failed_path,
+        )
\ No newline at end of file
@@ -25,9 +25,9 @@ Feel free to extend – all stubs raise ``NotImplementedError``.
 from __future__ import annotations
 
 import datetime as _dt
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union, get_args, get_origin
 
-from pydantic import BaseModel, Field, computed_field
+from pydantic import BaseModel, Field, PrivateAttr, computed_field
 
 try:
     import numpy as _np  # Optional dependency
@@ -35,6 +35,20 @@ except ModuleNotFoundError:  # pragma: no cover – keep lightweight
     _np = None  # type: ignore
 
 
+def _require_numpy() -> None:
+    """Raise a helpful error from numpy-only helpers when numpy is missing."""
+    if _np is None:
+        raise ImportError("This helper needs numpy: pip install numpy")
+
+
+def tanimoto_batch(query_bits: Any, db_bits: Any) -> Any:
+    """Tanimoto of one packed ``uint8`` fingerprint against each row of a packed ``(N, B)`` matrix."""
+    _require_numpy()
+    common = _np.bitwise_count(_np.bitwise_and(db_bits, query_bits)).sum(axis=-1, dtype=_np.int64)
+    total = _np.bitwise_count(_np.bitwise_or(db_bits, query_bits)).sum(axis=-1, dtype=_np.int64)
+    return _np.divide(common, total, out=_np.zeros(total.shape), where=total > 0)
+
+
 # -----------------------------------------------------------------------------
 # === Sub-models ===============================================================
 # -----------------------------------------------------------------------------
@@ -62,6 +76,32 @@ class Structure(BaseModel):
         None, description="Spin multiplicity (2S + 1)",
     )
 
+    def xyz_into(self, out: Any) -> Any:
+        """Copy coordinates into a caller-owned ``(≥N, 3)`` buffer; return the filled rows.
+
+        Lets batch loaders fill one preallocated array instead of allocating per molecule.
+        A structure without coordinates fills nothing and returns ``out[:0]``.
+        """
+        if self.xyz is None:
+            return out[:0]
+        n = len(self.xyz)
+        out[:n] = self.xyz
+        return out[:n]
+
+    def distance_matrix(self) -> Any:
+        """Interatomic distances (Å) as an ``(N, N)`` array.
+
+        Uses |a - b|² = |a|² + |b|² - 2a·b, so the work is one BLAS matrix product
+        with no ``(N, N, 3)`` difference temporary.
+        """
+        _require_numpy()
+        xyz = _np.asarray(self.xyz, dtype=_np.float64)
+        sq = _np.einsum("ij,ij->i", xyz, xyz)
+        d2 = sq[:, None] + sq[None, :] - 2.0 * (xyz @ xyz.T)
+        _np.maximum(d2, 0.0, out=d2)  # clip rounding noise below zero
+        _np.fill_diagonal(d2, 0.0)
+        return _np.sqrt(d2, out=d2)
+
     def to_rdkit(self) -> Any:  # pragma: no cover – stub
         """Return an RDKit Mol object with coordinates & charges."""
         raise NotImplementedError
@@ -189,6 +229,29 @@ class Search(BaseModel):
     maccs: Optional[str] = Field(None, description="MACCS keys in hex")
     embeddings: Embeddings = Field(default_factory=Embeddings, description="Float-vector embeddings")
 
+    # Decoded fingerprints, keyed by the hex they came from so a reassigned
+    # ecfp/maccs is never served stale
+    _fp_cache: Dict[str, Tuple[str, Any]] = PrivateAttr(default_factory=dict)
+
+    def _fp_bytes(self, name: str) -> Optional[Any]:
+        hex_str = getattr(self, name)
+        if hex_str is None:
+            return None
+        _require_numpy()
+        cached = self._fp_cache.get(name)
+        if cached is None or cached[0] != hex_str:
+            cached = (hex_str, _np.frombuffer(bytes.fromhex(hex_str), dtype=_np.uint8))
+            self._fp_cache[name] = cached
+        return cached[1]
+
+    def ecfp_bits(self) -> Optional[Any]:
+        """Packed ECFP as a read-only ``uint8`` array (``np.packbits`` layout), decoded once."""
+        return self._fp_bytes("ecfp")
+
+    def maccs_bits(self) -> Optional[Any]:
+        """Packed MACCS keys as a read-only ``uint8`` array, decoded once."""
+        return self._fp_bytes("maccs")
+
     def generate_fingerprint(self, method: str = "ecfp", radius: int = 2) -> str:
         """Generate a molecular fingerprint string using specified method and radius."""
         raise NotImplementedError
@@ -212,7 +275,7 @@ class Meta(BaseModel):
     """Provenance, units & caching metadata."""
 
     fetched: _dt.datetime = Field(
-        default_factory=_dt.datetime.utcnow,
+        default_factory=lambda: _dt.datetime.now(_dt.UTC),
         description="UTC timestamp when data was fetched",
     )
     source: str = Field("PubChem", description="Primary data source")
@@ -253,6 +316,29 @@ class Molecule(BaseModel):
         path_obj.write_text(self.to_json())
         self.meta.cache_path = str(path_obj)
 
+    @classmethod
+    def batch_cache(cls, mols: Iterable["Molecule"], path: str, chunk: int = 1024) -> int:
+        """Write many Molecules to one JSONL file, *chunk* records per write; returns the count.
+
+        Each molecule's ``meta.cache_path`` is set once it has been serialised.
+        """
+        import pathlib
+
+        path_obj = pathlib.Path(path)
+        n = 0
+        buf = bytearray()
+        with path_obj.open("wb") as f:
+            for n, mol in enumerate(mols, 1):
+                buf += mol.model_dump_json(exclude_none=True).encode()
+                buf += b"\n"
+                mol.meta.cache_path = str(path_obj)
+                if n % chunk == 0:
+                    f.write(buf)
+                    buf.clear()
+            if buf:
+                f.write(buf)
+        return n
+
     def to_qiskit(self, **kwargs) -> Any:
         """Proxy to quantum.to_qiskit for Qiskit export."""
         return self.quantum.to_qiskit(**kwargs)
@@ -270,14 +356,61 @@ class Molecule(BaseModel):
     def from_json(cls, data: str | Dict[str, Any]) -> "Molecule":
         """Construct a Molecule from raw JSON text or dict."""
         if isinstance(data, str):
-            import json
+            import orjson
 
-            data = json.loads(data)
+            data = orjson.loads(data)
         return cls.model_validate(data)
 
+    @classmethod
+    def from_trusted_json(cls, data: str | bytes | Dict[str, Any]) -> "Molecule":
+        """Rebuild a Molecule from JSON this library wrote (e.g. via ``cache``), skipping validation.
+
+        Sub-models are assembled with ``model_construct``: values are kept exactly as
+        decoded, except that datetime fields such as ``meta.fetched`` are parsed back
+        from ISO 8601. Do not use on untrusted input – use ``from_json`` instead.
+        """
+        if isinstance(data, (str, bytes)):
+            import orjson
+
+            data = orjson.loads(data)
+        return _construct(cls, data)
+
+
+def _construct(model_cls: type[BaseModel], data: Dict[str, Any]) -> Any:
+    """Recursively ``model_construct`` *model_cls* and its nested sub-model fields from *data*."""
+    values: Dict[str, Any] = {}
+    for key, value in data.items():
+        field = model_cls.model_fields.get(key)
+        sub = field.annotation if field is not None else None
+        if isinstance(value, dict) and isinstance(sub, type) and issubclass(sub, BaseModel):
+            value = _construct(sub, value)
+        elif sub is not None:
+            value = _restore_json_types(sub, value)
+        values[key] = value
+    return model_cls.model_construct(**values)
+
+
+def _restore_json_types(annotation: Any, value: Any) -> Any:
+    """Undo what JSON flattened for *annotation*: tuples came back as lists, datetimes as ISO strings.
+
+    Serialisers expect the declared types and warn on anything else.
+    """
+    args = [a for a in get_args(annotation) if a is not type(None)]
+    if get_origin(annotation) is Union and len(args) == 1:  # Optional[X]
+        annotation, args = args[0], list(get_args(args[0]))
+    origin = get_origin(annotation)
+    if annotation is _dt.datetime and isinstance(value, str):
+        return _dt.datetime.fromisoformat(value)
+    if origin is tuple and isinstance(value, list):
+        return tuple(value)
+    if origin is list and args and get_origin(args[0]) is tuple and isinstance(value, list):
+        return [tuple(v) if isinstance(v, list) else v for v in value]
+    return value
+
 
 __all__ = [
     "Molecule",
+    "tanimoto_batch",
     "Structure",
     "Quantum",
     "Thermo",
@@ -1,11 +1,41 @@
+import hashlib
 import logging
+import os
+import random
+import time
+from collections import OrderedDict
+from pathlib import Path
 from typing import Optional, List
+
+import httpx
+import numpy as np
+import requests
 from ibm_watsonx_ai.foundation_models import Embeddings
 from ibm_watsonx_ai import Credentials
 
+from robotu_molkit.constants import MAX_RETRIES, RETRY_STATUSES, EMBED_BATCH_SIZE, EMBED_CACHE_SIZE
+
+EMBED_BACKENDS = ("watsonx", "fastembed")
+# Dropped connections and timeouts from either HTTP stack the SDK may use
+_TRANSIENT_ERRORS = (requests.ConnectionError, requests.Timeout, httpx.TransportError)
+
 class WatsonxEmbeddingClient:
     """
     Wrap IBM watsonx-ai SDK Embeddings model to embed free-text queries.
+
+    Create one client and reuse it: the underlying Embeddings object holds
+    the IAM token and HTTP connection, so sharing it avoids re-authenticating
+    per call. Single-text embeddings are also kept in a small LRU, so
+    repeated queries skip the network.
+
+    With *cache_dir* set, vectors are also stored on disk as float32 .npy
+    files addressed by SHA-256 of (model, text); embed_batch then only sends
+    texts it has not seen before.
+
+    backend="fastembed" runs *model* locally through fastembed's ONNX Runtime
+    models instead of calling watsonx (optional dependency:
+    ``pip install robotu-molkit[local]``); its vectors are not comparable
+    with watsonx ones, so index and query with the same backend and model.
     """
     def __init__(
         self,
@@ -13,23 +43,102 @@ class WatsonxEmbeddingClient:
         project_id: str,
         ibm_url: str,
         model: str,
+        cache_dir: Optional[Path] = None,
+        backend: str = "watsonx",
     ):
+        if backend not in EMBED_BACKENDS:
+            raise ValueError(f"Unknown backend {backend!r}; expected one of {EMBED_BACKENDS}")
+        self.backend = backend
+        self.model = model
+        self.cache_dir = cache_dir
         self.api_key = api_key
         self.project_id = project_id
         self.ibm_url = ibm_url.rstrip('/')
-        self.embedder = Embeddings(
-            model_id=model,
-            credentials=Credentials(api_key=self.api_key, url=self.ibm_url),
-            project_id=self.project_id,
-        )
+        if backend == "fastembed":
+            try:
+                from fastembed import TextEmbedding
+            except ImportError as exc:
+                raise ImportError(
+                    "backend='fastembed' needs the fastembed package: pip install robotu-molkit[local]"
+                ) from exc
+            self.embedder = TextEmbedding(model_name=model)
+        else:
+            self.embedder = Embeddings(
+                model_id=model,
+                credentials=Credentials(api_key=self.api_key, url=self.ibm_url),
+                project_id=self.project_id,
+            )
+        self._cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
 
-    def embed(self, text: str) -> Optional[List[float]]:
+    def embed(self, text: str) -> Optional[np.ndarray]:
         """
-        Return the embedding vector for a single text string.
+        Return the float32 embedding vector for a single text string (cached).
         """
-        try:
-            # Watsonx expects a list of strings; take the first (and only) vector.
-            return self.embedder.embed_documents(texts=[text],)[0]
-        except Exception as exc:
-            logging.warning("Embedding error: %s", exc)
+        if text in self._cache:
+            self._cache.move_to_end(text)
+            return self._cache[text]
+        vectors = self.embed_batch([text])
+        if vectors is None or not len(vectors):
             return None
+        self._cache[text] = vectors[0]
+        if len(self._cache) > EMBED_CACHE_SIZE:
+            self._cache.popitem(last=False)
+        return vectors[0]
+
+    def embed_batch(self, texts: List[str]) -> Optional[np.ndarray]:
+        """
+        Return a (len(texts), dim) float32 array, one row per text in order,
+        from a single request (cache hits excluded when cache_dir is set);
+        None if the request fails.
+        """
+        if self.cache_dir is None:
+            return self._request(texts)
+        paths = [self._cache_path(t) for t in texts]
+        rows: List[Optional[np.ndarray]] = [np.load(p) if p.exists() else None for p in paths]
+        misses = [i for i, row in enumerate(rows) if row is None]
+        if misses:
+            fetched = self._request([texts[i] for i in misses])
+            if fetched is None:
+                return None
+            for i, row in zip(misses, fetched):
+                rows[i] = row
+                self._store(paths[i], row)
+        return np.stack(rows) if rows else np.empty((0, 0), dtype=np.float32)
+
+    def _cache_path(self, text: str) -> Path:
+        digest = hashlib.sha256(f"{self.model}\0{text}".encode()).hexdigest()
+        return self.cache_dir / digest[:2] / f"{digest}.npy"
+
+    @staticmethod
+    def _store(path: Path, vector: np.ndarray) -> None:
+        # Write then rename, so concurrent readers never see a partial file
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.stem}.{os.getpid()}.tmp.npy")
+        np.save(tmp, vector)
+        os.replace(tmp, path)
+
+    def _request(self, texts: List[str]) -> Optional[np.ndarray]:
+        """
+        One embed_documents call for *texts*, as a (len(texts), dim) float32 array.
+        The fastembed backend embeds locally instead and is not retried.
+
+        Throttling (429), server errors and connection failures are retried up
+        to MAX_RETRIES times with jittered exponential backoff; other errors
+        are logged and yield None.
+        """
+        if self.backend == "fastembed":
+            vectors = list(self.embedder.embed(texts, batch_size=EMBED_BATCH_SIZE))
+            return np.asarray(vectors, dtype=np.float32)
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                vectors = self.embedder.embed_documents(texts=texts)
+                return np.asarray(vectors, dtype=np.float32)
+            except Exception as exc:
+                status = getattr(getattr(exc, "response", None), "status_code", None)
+                retryable = status in RETRY_STATUSES or isinstance(exc, _TRANSIENT_ERRORS)
+                if attempt == MAX_RETRIES or not retryable:
+                    logging.warning("Embedding error: %s", exc)
+                    return None
+                delay = 2 ** attempt + random.random()
+                logging.info("Embedding request failed (%s); retry %d/%d in %.1fs", exc, attempt + 1, MAX_RETRIES, delay)
+                time.sleep(delay)
@@ -1,39 +1,216 @@
-import json
+import orjson
 from pathlib import Path
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Optional, Tuple
 import numpy as np
 import faiss
 
+from robotu_molkit.constants import FILTER_EXACT_MAX, HNSW_M, IVF_NPROBE, IVF_TRAIN_SIZE
+
+INDEX_TYPES = ("flat", "hnsw", "sq8", "ivfpq")
+
+def _is_number(v: Any) -> bool:
+    return isinstance(v, (int, float)) and not isinstance(v, bool)
+
 class FAISSIndexManager:
     """
     Builds and queries a FAISS index from precomputed vectors and metadata.
+
+    index_type selects the search structure:
+      • "flat"  – exact inner-product scan (default).
+      • "hnsw"  – HNSW graph; approximate, sub-linear queries on large sets.
+      • "sq8"   – full scan over 8-bit scalar-quantized codes (one byte per
+        dimension, 4x smaller than float32); every vector is visited but
+        scores are approximate.
+      • "ivfpq" – inverted lists with product quantization (dim/8 bytes per
+        vector).
+    "sq8" and "ivfpq" are trained on the first IVF_TRAIN_SIZE vectors of the
+    first bulk load, so build them with load_jsonl rather than add().
     """
-    def __init__(self, dim: int):
+    def __init__(self, dim: int, index_type: str = "flat"):
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index_type {index_type!r}; expected one of {INDEX_TYPES}")
+        self.dim = dim
+        self.index_type = index_type
         # Use inner product on L2-normalized vectors for cosine similarity
-        self._index = faiss.IndexFlatIP(dim)
+        self._index: Optional[faiss.Index] = None
+        if index_type == "flat":
+            self._index = faiss.IndexFlatIP(dim)
+        elif index_type == "hnsw":
+            self._index = faiss.IndexHNSWFlat(dim, HNSW_M, faiss.METRIC_INNER_PRODUCT)
         self.metadata: List[Dict[str, Any]] = []
+        # Numeric metadata fields as float64 columns, built on first use
+        self._columns: Dict[str, Optional[np.ndarray]] = {}
+
+    def column(self, key: str) -> Optional[np.ndarray]:
+        """
+        float64 column of metadata field *key* aligned with index ids (NaN where
+        missing), or None if the field holds anything other than numbers.
+        """
+        if key not in self._columns:
+            values = [m.get(key) for m in self.metadata]
+            if all(v is None or _is_number(v) for v in values):
+                self._columns[key] = np.array(
+                    [np.nan if v is None else v for v in values], dtype=np.float64
+                )
+            else:
+                self._columns[key] = None
+        return self._columns[key]
+
+    def _add_rows(self, vecs: np.ndarray) -> None:
+        """Add already-normalised rows, training a quantized index on first use."""
+        if self._index is None and self.index_type == "sq8":
+            index = faiss.IndexScalarQuantizer(
+                self.dim, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT
+            )
+            index.train(vecs[:IVF_TRAIN_SIZE])
+            self._index = index
+        elif self._index is None:
+            if self.dim % 8:
+                raise ValueError(f"ivfpq needs a dimension divisible by 8, got {self.dim}")
+            train = vecs[:IVF_TRAIN_SIZE]
+            if len(train) < 256:
+                raise ValueError(f"ivfpq needs at least 256 vectors to train its 8-bit codebooks, got {len(train)}")
+            # ~sqrt(N) lists, capped so every list still gets training points
+            nlist = max(1, min(4096, int(np.sqrt(len(vecs))), len(train) // 39))
+            quantizer = faiss.IndexFlatIP(self.dim)
+            index = faiss.IndexIVFPQ(quantizer, self.dim, nlist, self.dim // 8, 8, faiss.METRIC_INNER_PRODUCT)
+            index.train(train)
+            index.nprobe = min(IVF_NPROBE, nlist)
+            self._quantizer = quantizer  # keep alive alongside the index
+            self._index = index
+        self._index.add(vecs)
 
     def add(self, vector: np.ndarray, meta: Dict[str, Any]):
-        vec = vector / np.linalg.norm(vector)
-        self._index.add(vec.reshape(1, -1))
+        vec = np.array(vector, dtype="float32").reshape(1, -1)
+        faiss.normalize_L2(vec)
+        self._add_rows(vec)
         self.metadata.append(meta)
+        self._columns.clear()
 
     def load_jsonl(self, jsonl_path: Path, vector_key: str = "vector"):
-        with jsonl_path.open('r') as f:
+        # Stream records into a float32 buffer grown by doubling, then
+        # normalise and add them to FAISS in a single call
+        vecs = np.empty((1024, self.dim), dtype="float32")
+        n = 0
+        with jsonl_path.open('rb') as f:
+            for line in f:
+                rec = orjson.loads(line)
+                if n == len(vecs):
+                    vecs = np.resize(vecs, (2 * len(vecs), vecs.shape[1]))
+                # The vector lives in FAISS: keeping its boxed floats in metadata
+                # too would dominate resident memory
+                vecs[n] = rec.pop(vector_key)
+                self.metadata.append(rec)
+                n += 1
+        if n:
+            vecs = np.ascontiguousarray(vecs[:n])
+            faiss.normalize_L2(vecs)
+            self._add_rows(vecs)
+        self._columns.clear()
+
+    def save(self, index_path: Path) -> None:
+        """Write the FAISS index to *index_path* (vectors only; metadata stays in the JSONL)."""
+        if self._index is not None:
+            faiss.write_index(self._index, str(index_path))
+
+    def load_saved(self, index_path: Path, jsonl_path: Path, vector_key: str = "vector") -> None:
+        """
+        Memory-map an index written by save() and read metadata from the JSONL
+        it was built from, skipping vector normalisation and index training.
+        Processes that map the same file share its pages.
+        """
+        # IO_FLAG_MMAP only maps IVF inverted lists; flat, HNSW and SQ8 storage
+        # needs the in-place (IFC) reader to be mapped rather than copied
+        mmap_flag = faiss.IO_FLAG_MMAP if self.index_type == "ivfpq" else faiss.IO_FLAG_MMAP_IFC
+        index = faiss.read_index(str(index_path), mmap_flag | faiss.IO_FLAG_READ_ONLY)
+        metadata: List[Dict[str, Any]] = []
+        with jsonl_path.open('rb') as f:
             for line in f:
-                rec = json.loads(line)
-                vec = np.array(rec[vector_key], dtype="float32")
-                self.add(vec, rec)
+                rec = orjson.loads(line)
+                rec.pop(vector_key, None)
+                metadata.append(rec)
+        if index.ntotal != len(metadata) or index.d != self.dim:
+            raise ValueError(f"{index_path} does not match {jsonl_path}")
+        self._index = index
+        self.metadata = metadata
+        self._columns.clear()
 
     def search(
         self,
         query_vec: np.ndarray,
-        top_k: int
-    ) -> List[Tuple[Dict[str, Any], float]]:
-        q = query_vec / np.linalg.norm(query_vec)
-        D, I = self._index.search(q.reshape(1, -1), top_k)
-        results: List[Tuple[Dict[str, Any], float]] = []
-        for idx, score in zip(I[0], D[0]):
-            if 0 <= idx < len(self.metadata):
-                results.append((self.metadata[idx], float(score)))
-        return results
\ No newline at end of file
+        top_k: int,
+        mask: Optional[np.ndarray] = None,
+        return_ids: bool = False,
+    ) -> List[Tuple[Any, ...]]:
+        return self.search_many(query_vec.reshape(1, -1), top_k, mask, return_ids)[0]
+
+    def search_many(
+        self,
+        query_vecs: np.ndarray,
+        top_k: int,
+        mask: Optional[np.ndarray] = None,
+        return_ids: bool = False,
+    ) -> List[List[Tuple[Any, ...]]]:
+        """
+        Search a (B, d) batch of queries in one FAISS call; one hit list per row.
+        Hits are (metadata, score), or (metadata, score, row id) with *return_ids*,
+        so callers can index per-row arrays aligned with the index.
+
+        A boolean *mask* over index ids (see column()) is applied inside FAISS:
+        rows whose entry is False are never scored. "flat" and "sq8" always
+        return up to *top_k* matching hits. The graph / inverted-list walks of
+        "hnsw" and "ivfpq" can miss most of a small selection, so when at most
+        FILTER_EXACT_MAX rows pass they are scanned exhaustively instead;
+        beyond that those indexes may return fewer than *top_k* hits.
+        """
+        if self._index is None or (mask is not None and not mask.any()):
+            return [[] for _ in range(len(query_vecs))]
+        # Copy, then normalise in place; zero vectors stay zero instead of NaN
+        q = np.array(query_vecs, dtype="float32")
+        faiss.normalize_L2(q)
+        if mask is None:
+            D, I = self._index.search(q, top_k)
+        else:
+            # The selector reads *bitmap* in place, so it must outlive the search
+            bitmap = np.packbits(mask, bitorder="little")
+            selector = faiss.IDSelectorBitmap(len(bitmap), faiss.swig_ptr(bitmap))
+            exhaustive = int(mask.sum()) <= FILTER_EXACT_MAX
+            if exhaustive and self.index_type == "hnsw":
+                D, I = self._exact_search(q, np.flatnonzero(mask), top_k)
+            else:
+                D, I = self._index.search(q, top_k, params=self._search_params(selector, exhaustive))
+        batches: List[List[Tuple[Any, ...]]] = []
+        for ids, scores in zip(I, D):
+            results: List[Tuple[Any, ...]] = []
+            for idx, score in zip(ids, scores):
+                if 0 <= idx < len(self.metadata):
+                    hit = (self.metadata[idx], float(score))
+                    results.append(hit + (int(idx),) if return_ids else hit)
+            batches.append(results)
+        return batches
+
+    def _search_params(self, selector: "faiss.IDSelector", exhaustive: bool = False) -> "faiss.SearchParameters":
+        """
+        Search parameters restricting the index to *selector*, keeping its own
+        tuning; *exhaustive* makes "ivfpq" probe every list.
+        """
+        if self.index_type == "hnsw":
+            return faiss.SearchParametersHNSW(sel=selector, efSearch=self._index.hnsw.efSearch)
+        if self.index_type == "ivfpq":
+            # SearchParametersIVF would otherwise reset nprobe to 1
+            nprobe = self._index.nlist if exhaustive else self._index.nprobe
+            return faiss.SearchParametersIVF(sel=selector, nprobe=nprobe)
+        return faiss.SearchParameters(sel=selector)
+
+    def _exact_search(self, q: np.ndarray, ids: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Brute-force inner product of *q* against the rows *ids*, shaped like Index.search output."""
+        scores = q @ self._index.reconstruct_batch(ids).T
+        k = min(top_k, len(ids))
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        D = np.full((len(q), top_k), -np.inf, dtype="float32")
+        I = np.full((len(q), top_k), -1, dtype="int64")
+        D[:, :k] = np.take_along_axis(top_scores, order, axis=1)
+        I[:, :k] = ids[np.take_along_axis(top, order, axis=1)]
+        return D, I
@@ -1,29 +1,57 @@
 import json
+import logging
 import re
+import threading
 import numpy as np
+import faiss
+import orjson
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
-from typing import Optional, Dict, Any, Tuple, List
+from typing import TYPE_CHECKING, Callable, Optional, Dict, Any, Tuple, List
 
 from robotu_molkit.credentials_manager import CredentialsManager
 from robotu_molkit.search.embedding_client import WatsonxEmbeddingClient
-from robotu_molkit.search.index_manager import FAISSIndexManager
+from robotu_molkit.search.index_manager import FAISSIndexManager, _is_number
 from robotu_molkit.constants import (
+    CACHE_DIR,
     DEFAULT_WATSONX_AI_URL,
     DEFAULT_EMBED_MODEL_ID,
-    DEFAULT_WATSONX_GENERATIVE_MODEL
+    DEFAULT_WATSONX_GENERATIVE_MODEL,
+    LOCAL_EMBED_MODEL_ID
 )
+from robotu_molkit.utils.utils import JsonCache
 
-from pubchempy import get_compounds
-from ibm_watsonx_ai.foundation_models import ModelInference
-from ibm_watsonx_ai import Credentials
-from ibm_watsonx_ai.metanames import GenTextParamsMetaNames as GenParams
+if TYPE_CHECKING:
+    from ibm_watsonx_ai.foundation_models import ModelInference
+
+_JSON_DECODER = json.JSONDecoder()
+
+@lru_cache(maxsize=8)
+def _json_block_re(key: str) -> re.Pattern:
+    """Compiled pattern for the first flat JSON object containing *key*."""
+    return re.compile(r"\{[^{}]*?\"" + re.escape(key) + r"\"[^{}]*?\}", re.S)
+
+# Granite answers and PubChem name → CID lookups are idempotent; keep them across runs
+_SCAFFOLD_CACHE = JsonCache(CACHE_DIR / "granite_scaffolds.json")
+_NAME_CID_CACHE = JsonCache(CACHE_DIR / "scaffold_cids.json")
 
 class QueryRefiner:
     """Utilities for scaffold inference and result post-processing."""
 
     def extract_json_list(txt: str, key: str) -> List[str]:
         """Extract list from the first JSON object containing the given key."""
-        json_match = re.search(r"\{[^{}]*?\"" + re.escape(key) + r"\"[^{}]*?\}", txt, flags=re.S)
+        # Common case: the answer is a JSON object, possibly after a short preamble
+        start = txt.find("{")
+        if start >= 0:
+            try:
+                obj, _ = _JSON_DECODER.raw_decode(txt, start)
+            except json.JSONDecodeError:
+                obj = None
+            if isinstance(obj, dict) and isinstance(obj.get(key), list):
+                return [s.strip() for s in obj[key] if isinstance(s, str) and s.strip()]
+        # Otherwise hunt for a flat object mentioning the key
+        json_match = _json_block_re(key).search(txt)
         if json_match:
             block = json_match.group(0)
             try:
@@ -39,7 +67,11 @@ class QueryRefiner:
         return []
 
     @staticmethod
-    def extract_scaffolds_with_granite(model: ModelInference, query: str) -> List[str]:
+    def extract_scaffolds_with_granite(model: "ModelInference", query: str) -> List[str]:
+        key = f"{model.model_id}\0{query}"
+        cached = _SCAFFOLD_CACHE.get(key)
+        if cached is not None:
+            return cached
         prompt = (
             f"You are a molecular search assistant."
             f"Extract only the canonical names of up to three well-known molecules that structurally represent the query:"
@@ -47,23 +79,49 @@ class QueryRefiner:
             f"Return only this response Format:{{\"canonical_names\": [\"...\"]}}"
         )
         response = model.generate_text(prompt=prompt)
-        
-        return QueryRefiner.extract_json_list(response, "canonical_names")
+
+        names = QueryRefiner.extract_json_list(response, "canonical_names")
+        if names:
+            _SCAFFOLD_CACHE.set(key, names)
+        return names
+
+    @staticmethod
+    def scaffold_name_to_cid(name: str) -> Optional[int]:
+        """Resolve a scaffold name to its PubChem CID (cached), or None if unknown."""
+        cid = _NAME_CID_CACHE.get(name.lower())
+        if cid is None:
+            from pubchempy import get_compounds
+            compounds = get_compounds(name, "name", listkey_count=1)
+            if not compounds:
+                return None
+            cid = compounds[0].cid
+            _NAME_CID_CACHE.set(name.lower(), cid)
+        return cid
 
     @staticmethod
     def resolve_scaffolds_to_bitvectors(
         scaffold_names: List[str], searcher: "LocalSearch"
     ) -> List[np.ndarray]:
-        """Fetch scaffold metadata and return their ECFP vectors (1 024‑long 0/1)."""
+        """Fetch scaffold metadata and return their packed ECFP vectors."""
+        def lookup(name: str) -> Tuple[Optional[int], Optional[Exception]]:
+            try:
+                return QueryRefiner.scaffold_name_to_cid(name), None
+            except Exception as e:
+                return None, e
+
+        # PubChem lookups are network-bound: overlap them (3 workers stay under 5 req/s)
+        with ThreadPoolExecutor(max_workers=3) as ex:
+            resolved = list(ex.map(lookup, scaffold_names))
+
         vectors: List[np.ndarray] = []
-        for name in scaffold_names:
+        for name, (cid, err) in zip(scaffold_names, resolved):
+            if cid is None:
+                if err is not None:
+                    print(f"⚠️ Failed to resolve scaffold '{name}': {err}")
+                continue
             try:
-                compounds = get_compounds(name, "name", listkey_count=1)
-                if not compounds:
-                    continue
-                cid = compounds[0].cid
                 meta = searcher.get(cid)
-                vectors.append(np.array(meta["ecfp"], dtype=int))
+                vectors.append(QueryRefiner.ecfp_bits_from_meta(meta))
                 print(f"✅ CID {cid} for '{name}' → ECFP vector loaded")
             except Exception as e:
                 print(f"⚠️ Failed to resolve scaffold '{name}': {e}")
@@ -72,16 +130,105 @@ class QueryRefiner:
     # Utility functions for ECFP and Tanimoto
     @staticmethod
     def ecfp_bits_from_meta(meta: Dict[str, Any]) -> np.ndarray:
-        """Return the 1 024‑bit ECFP vector stored in the metadata."""
-        return np.array(meta["ecfp"], dtype=int)
+        """
+        Return the 1024-bit ECFP from the metadata packed into 16 uint64 words.
+
+        Accepts the packed hex string written by the parser, or the dense 0/1
+        list found in vector files built by older releases.
+        """
+        ecfp = meta["ecfp"]
+        if isinstance(ecfp, str):
+            return np.frombuffer(bytes.fromhex(ecfp), dtype=np.uint8).view(np.uint64)
+        return np.packbits(np.asarray(ecfp, dtype=np.uint8)).view(np.uint64)
 
     @staticmethod
     def tanimoto_bits(a: np.ndarray, b: np.ndarray) -> float:
-        """Compute Tanimoto similarity between two binary numpy arrays."""
-        common = np.bitwise_and(a, b).sum()
-        total  = np.bitwise_or(a, b).sum()
+        """Compute Tanimoto similarity between two packed uint64 fingerprints."""
+        common = int(np.bitwise_count(a & b).sum())
+        total  = int(np.bitwise_count(a | b).sum())
         return common / total if total else 0.0
 
+    @staticmethod
+    def tanimoto_matrix(cands: np.ndarray, refs: np.ndarray) -> np.ndarray:
+        """
+        Tanimoto similarity of every packed candidate (N, W) against every reference (R, W) → (N, R).
+
+        Hamming distances come from a FAISS binary index over the references (SIMD popcount),
+        then T = (|a| + |b| - H) / (|a| + |b| + H).
+        """
+        index = faiss.IndexBinaryFlat(refs.shape[1] * 64)
+        index.add(np.ascontiguousarray(refs).view(np.uint8))
+        H, I = index.search(np.ascontiguousarray(cands).view(np.uint8), len(refs))
+        # FAISS returns neighbours sorted by distance; put them back in reference order
+        ham = np.empty_like(H)
+        np.put_along_axis(ham, I, H, axis=1)
+        total = (np.bitwise_count(cands).sum(axis=1)[:, None]
+                 + np.bitwise_count(refs).sum(axis=1)[None, :]).astype(np.int64)
+        return np.divide(total - ham, total + ham, out=np.zeros(ham.shape), where=total + ham > 0)
+
+def _compile_filters(filters: Dict[str, Any]) -> List[Callable[[Dict[str, Any]], bool]]:
+    """
+    Metadata filter as one checker per key, dispatched on the condition type
+    once rather than per hit: (lo, hi) tuples are inclusive ranges, lists
+    allowed values, anything else equality.
+    """
+    checks: List[Callable[[Dict[str, Any]], bool]] = []
+    for k, cond in filters.items():
+        if isinstance(cond, tuple):
+            lo, hi = cond
+            checks.append(lambda m, k=k, lo=lo, hi=hi: (v := m.get(k)) is not None and lo <= v <= hi)
+        elif isinstance(cond, list):
+            try:
+                allowed = frozenset(cond)
+            except TypeError:  # unhashable allowed values: keep the list scan
+                checks.append(lambda m, k=k, cond=cond: m.get(k) in cond)
+            else:
+                checks.append(lambda m, k=k, allowed=allowed, cond=cond: _member(m.get(k), allowed, cond))
+        else:
+            checks.append(lambda m, k=k, cond=cond: m.get(k) == cond)
+    return checks
+
+def _member(v: Any, allowed: frozenset, cond: List[Any]) -> bool:
+    try:
+        return v in allowed
+    except TypeError:  # unhashable metadata value (e.g. a tag list)
+        return v in cond
+
+def _split_filters(index: FAISSIndexManager,
+                   filters: Dict[str, Any]) -> Tuple[Optional[np.ndarray], Dict[str, Any]]:
+    """
+    Turn numeric filters on numeric metadata columns into one boolean mask over
+    index ids (same semantics as _compile_filters; NaN never matches). Returns
+    the mask (None if no filter qualified) and the filters left for _compile_filters.
+    """
+    masks: List[np.ndarray] = []
+    rest: Dict[str, Any] = {}
+    for k, cond in filters.items():
+        if isinstance(cond, tuple):
+            numeric = len(cond) == 2 and all(_is_number(c) for c in cond)
+        elif isinstance(cond, list):
+            numeric = all(_is_number(c) for c in cond)
+        else:
+            numeric = _is_number(cond)
+        col = index.column(k) if numeric else None
+        if col is None:
+            rest[k] = cond
+        elif isinstance(cond, tuple):
+            masks.append((col >= cond[0]) & (col <= cond[1]))
+        elif isinstance(cond, list):
+            masks.append(np.isin(col, cond))
+        else:
+            masks.append(col == cond)
+    return (np.logical_and.reduce(masks) if masks else None), rest
+
+def _filter_hits(hits: List[Tuple[Any, ...]],
+                 checks: List[Callable[[Dict[str, Any]], bool]],
+                 top_k: int) -> List[Tuple[Any, ...]]:
+    # Hits start with their metadata; any trailing fields (score, row id) pass through
+    if not checks:
+        return hits[:top_k]
+    return [hit for hit in hits if all(check(hit[0]) for check in checks)][:top_k]
+
 class LocalSearch:
     """Local semantic search with metadata filters and structural refinement via Tanimoto."""
     def __init__(
@@ -90,7 +237,10 @@ class LocalSearch:
         override_api_key: Optional[str] = None,
         override_project_id: Optional[str] = None,
         ibm_url: str = DEFAULT_WATSONX_AI_URL,
-        embed_model_id: str = DEFAULT_EMBED_MODEL_ID
+        embed_model_id: str = DEFAULT_EMBED_MODEL_ID,
+        index_type: str = "flat",
+        cache_index: bool = True,
+        embed_backend: str = "watsonx",
     ):
         api_key, project_id = CredentialsManager.load(override_api_key, override_project_id)
         if not api_key or not project_id:
@@ -98,65 +248,165 @@ class LocalSearch:
         self.api_key = api_key
         self.project_id = project_id
         self.ibm_url = ibm_url
+        if embed_backend == "fastembed" and embed_model_id == DEFAULT_EMBED_MODEL_ID:
+            # The Granite embedding models are watsonx-only (same default as `molkit embed`)
+            embed_model_id = LOCAL_EMBED_MODEL_ID
+        # Query embeddings are persisted, so repeated queries skip watsonx across runs too
         self.embed_client = WatsonxEmbeddingClient(api_key=api_key, project_id=project_id,
-                                                   ibm_url=ibm_url, model=embed_model_id)
+                                                   ibm_url=ibm_url, model=embed_model_id,
+                                                   cache_dir=CACHE_DIR / "embeddings",
+                                                   backend=embed_backend)
+        self._granite_model: Optional["ModelInference"] = None
+        self._granite_lock = threading.Lock()
+        self._ecfp_packed: Optional[np.ndarray] = None  # built on first structural search
         path = Path(jsonl_path)
-        first = json.loads(path.open().read().splitlines()[0])
+        # Only the first record is needed to size the index
+        with path.open('rb') as f:
+            first = orjson.loads(f.readline())
         dim = len(first.get("vector", []))
-        self.index = FAISSIndexManager(dim)
-        self.index.load_jsonl(path)
+        # "flat" is exact; "hnsw" / "sq8" / "ivfpq" trade recall for speed / memory on large sets
+        self.index = self._load_index(path, dim, index_type, cache_index)
+        self._jsonl_path = path
+        self._cache_index = cache_index
+        # CID → metadata row, so get() is a dict lookup; the first record wins on duplicates
+        self._cid_rows: Dict[int, int] = {}
+        for row, meta in enumerate(self.index.metadata):
+            cid = meta.get("cid")
+            if cid is not None:
+                self._cid_rows.setdefault(cid, row)
+
+    @staticmethod
+    def _load_index(path: Path, dim: int, index_type: str, cache_index: bool) -> FAISSIndexManager:
+        """
+        Build the index from the JSONL. The built index is saved next to it and
+        memory-mapped by later instances (e.g. one per server worker) until the
+        JSONL changes.
+        """
+        index = FAISSIndexManager(dim, index_type=index_type)
+        index_path = path.with_name(f"{path.stem}.{index_type}.faiss")
+        if cache_index and index_path.exists() and index_path.stat().st_mtime >= path.stat().st_mtime:
+            try:
+                index.load_saved(index_path, path)
+                return index
+            except (RuntimeError, ValueError) as e:
+                logging.warning("Ignoring stale FAISS index %s: %s", index_path, e)
+                index = FAISSIndexManager(dim, index_type=index_type)
+        index.load_jsonl(path)
+        if cache_index:
+            try:
+                index.save(index_path)
+            except (OSError, RuntimeError) as e:
+                logging.warning("Could not save FAISS index to %s: %s", index_path, e)
+        return index
 
     def get(self, cid: int) -> Dict[str, Any]:
-        for meta in self.index.metadata:
-            if meta.get("cid") == cid:
-                return meta
-        raise KeyError(f"CID {cid} not found in index.")
+        row = self._cid_rows.get(cid)
+        if row is None:
+            raise KeyError(f"CID {cid} not found in index.")
+        return self.index.metadata[row]
+
+    def _ecfp_matrix(self) -> np.ndarray:
+        """
+        Packed (N, 16) uint64 ECFP of every indexed record (zeros if missing),
+        decoded once. Like the FAISS index, it is saved next to the JSONL and
+        memory-mapped by later instances until the JSONL changes.
+        """
+        if self._ecfp_packed is None:
+            path = self._jsonl_path
+            npy_path = path.with_name(f"{path.stem}.ecfp.npy")
+            if self._cache_index and npy_path.exists() and npy_path.stat().st_mtime >= path.stat().st_mtime:
+                words = np.load(npy_path, mmap_mode="r")
+                if words.shape == (len(self.index.metadata), 16) and words.dtype == np.uint64:
+                    self._ecfp_packed = words
+                    return words
+                logging.warning("Ignoring stale fingerprint matrix %s", npy_path)
+            words = np.zeros((len(self.index.metadata), 16), dtype=np.uint64)
+            for row, meta in enumerate(self.index.metadata):
+                if meta.get("ecfp"):
+                    words[row] = QueryRefiner.ecfp_bits_from_meta(meta)
+            if self._cache_index:
+                try:
+                    np.save(npy_path, words)
+                except OSError as e:
+                    logging.warning("Could not save fingerprint matrix to %s: %s", npy_path, e)
+            self._ecfp_packed = words
+        return self._ecfp_packed
+
+    def _granite(self) -> "ModelInference":
+        """Granite generation client, built on first structural search and reused (thread-safe)."""
+        with self._granite_lock:
+            if self._granite_model is None:
+                # Generation client only needed on the structural path
+                from ibm_watsonx_ai import Credentials
+                from ibm_watsonx_ai.foundation_models import ModelInference
+                from ibm_watsonx_ai.metanames import GenTextParamsMetaNames as GenParams
+                creds = Credentials(api_key=self.api_key, url=self.ibm_url)
+                self._granite_model = ModelInference(
+                    model_id=DEFAULT_WATSONX_GENERATIVE_MODEL, credentials=creds, project_id=self.project_id,
+                    params={GenParams.MAX_NEW_TOKENS: 500, GenParams.TEMPERATURE: 0.2},
+                )
+            return self._granite_model
 
     def search_by_semantics(self, query_text: str, top_k: int = 10, filters: Optional[Dict[str, Any]] = None,
               faiss_k: int = 100) -> List[Tuple[Dict[str, Any], float]]:
+        return [(meta, score) for meta, score, _ in self._semantic_hits(query_text, top_k, filters, faiss_k)]
+
+    def _semantic_hits(self, query_text: str, top_k: int, filters: Optional[Dict[str, Any]],
+                       faiss_k: int) -> List[Tuple[Dict[str, Any], float, int]]:
+        """search_by_semantics hits as (metadata, score, index row)."""
         qvec = self.embed_client.embed(query_text)
         if qvec is None:
             return []
-        qarr = np.array(qvec, dtype="float32")
-        hits = self.index.search(qarr, faiss_k)
-        if not filters:
-            return hits[:top_k]
-        def passes(m: Dict[str, Any]) -> bool:
-            for k, cond in filters.items():
-                v = m.get(k)
-                if isinstance(cond, tuple):
-                    if v is None or not (cond[0] <= v <= cond[1]):
-                        return False
-                elif isinstance(cond, list):
-                    if v not in cond:
-                        return False
-                else:
-                    if v != cond:
-                        return False
-            return True
-        return [(m, s) for m, s in hits if passes(m)][:top_k]
+        mask, rest = _split_filters(self.index, filters) if filters else (None, {})
+        hits = self.index.search(qvec, faiss_k, mask, return_ids=True)
+        return _filter_hits(hits, _compile_filters(rest), top_k)
+
+    def search_by_semantics_many(self, query_texts: List[str], top_k: int = 10,
+                                 filters: Optional[Dict[str, Any]] = None,
+                                 faiss_k: int = 100) -> List[List[Tuple[Dict[str, Any], float]]]:
+        """
+        Batched search_by_semantics: one embedding request and one FAISS search
+        for all queries. Returns one hit list per query, in order.
+        """
+        if not query_texts:
+            return []
+        qvecs = self.embed_client.embed_batch(query_texts)
+        if qvecs is None:
+            return [[] for _ in query_texts]
+        mask, rest = _split_filters(self.index, filters) if filters else (None, {})
+        checks = _compile_filters(rest)
+        batches = self.index.search_many(qvecs, faiss_k, mask)
+        return [_filter_hits(hits, checks, top_k) for hits in batches]
 
     def search_by_semantics_and_structure(self, query_text: str, top_k: int = 20,
                             faiss_k: int = 300, filters: Optional[Dict[str, Any]] = None,
                             sim_threshold: float = 0.7) -> List[Tuple[Dict[str, Any], float, float]]:
-        # Step 1: Setup Granite
-        creds = Credentials(api_key=self.api_key, url=self.ibm_url)
-        model = ModelInference(model_id=DEFAULT_WATSONX_GENERATIVE_MODEL, credentials=creds,
-                               project_id=self.project_id, params={GenParams.MAX_NEW_TOKENS:500, GenParams.TEMPERATURE:0.2})
+        # Step 1: Setup Granite (created on first use, then reused)
+        model = self._granite()
         # Step 2: Infer scaffold names
         scaffold_names = QueryRefiner.extract_scaffolds_with_granite(model, query_text)
         print("🔍 Inferred scaffolds:", scaffold_names)
         # Step 3: Build reference ECFP vectors
         ref_vecs = QueryRefiner.resolve_scaffolds_to_bitvectors(scaffold_names, self)
         # Step 4: Raw semantic search
-        raw = self.search_by_semantics(query_text=query_text, top_k=faiss_k, filters=filters, faiss_k=faiss_k)
-        # Step 5: Filter by Tanimoto
+        raw = self._semantic_hits(query_text, faiss_k, filters, faiss_k)
+        if not ref_vecs:
+            # Nothing to compare against: every candidate would score 0 and fail the threshold
+            logging.warning("No scaffold fingerprints resolved; returning semantic ranking only")
+            return [(meta, score, 0.0) for meta, score, _ in raw[:top_k]]
+        # Step 5: Filter by Tanimoto (all candidates × all scaffolds in one kernel)
+        if raw:
+            # Each hit's own index row, so duplicate or missing CIDs cannot mix up fingerprints
+            cands = self._ecfp_matrix()[[row for _, _, row in raw]]
+            max_sims = QueryRefiner.tanimoto_matrix(cands, np.stack(ref_vecs)).max(axis=1)
+        else:
+            max_sims = np.zeros(len(raw))
         results: List[Tuple[Dict[str, Any], float, float]] = []
-        for meta, score in raw:
-            mol_vec = QueryRefiner.ecfp_bits_from_meta(meta)
-            sims = [QueryRefiner.tanimoto_bits(mol_vec, ref) for ref in ref_vecs]
-            max_sim = max(sims) if sims else 0.0
-            print(f"→ CID {meta.get('cid')} Name:{meta.get('name','<unknown>')} Tanimoto: {max_sim:.2f}")
+        # Per-candidate scores are debug detail: skip formatting them unless it is on
+        debug = logging.getLogger().isEnabledFor(logging.DEBUG)
+        for (meta, score, _), max_sim in zip(raw, max_sims.tolist()):
+            if debug:
+                logging.debug("→ CID %s Name:%s Tanimoto: %.2f", meta.get('cid'), meta.get('name', '<unknown>'), max_sim)
             if max_sim >= sim_threshold:
                 results.append((meta, score, max_sim))
         results.sort(key=lambda x: x[1], reverse=True)
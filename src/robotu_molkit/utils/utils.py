@@ -1 +1,52 @@
+# src/robotu_molkit/utils/utils.py
+import os
+import threading
+from itertools import islice
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, TypeVar
 
+import orjson
+
+T = TypeVar("T")
+
+
+def chunked(iterable: Iterable[T], n: int) -> Iterator[List[T]]:
+    """Yield successive lists of at most *n* items from *iterable*."""
+    it = iter(iterable)
+    while chunk := list(islice(it, n)):
+        yield chunk
+
+
+class JsonCache:
+    """
+    Tiny persistent string-keyed cache stored as a single JSON file.
+
+    Loaded lazily on first access and rewritten on every ``set``; meant for
+    small, slowly-growing maps such as LLM answers or name → CID lookups.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._data: Optional[Dict[str, Any]] = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, Any]:
+        if self._data is None:
+            try:
+                self._data = orjson.loads(self.path.read_bytes())
+            except (FileNotFoundError, orjson.JSONDecodeError):
+                self._data = {}
+        return self._data
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self._load().get(key, default)
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            data = self._load()
+            data[key] = value
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # Write then rename, so other processes never read a half-written file
+            tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+            tmp.write_bytes(orjson.dumps(data))
+            os.replace(tmp, self.path)
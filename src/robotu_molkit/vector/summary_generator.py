@@ -29,6 +29,13 @@ from robotu_molkit.constants import (
 
 __all__ = ["SummaryGenerator", "PromptManager"]
 
+# First flat JSON object carrying a "summary" key in a Granite response
+_SUMMARY_JSON_RE = re.compile(r"\{[^{}]*?\"summary\"[^{}]*?\}", re.S)
+# CAS numbers to drop from the alias list, and spectral peak values with units
+_CAS_RE = re.compile(r"\d{2,7}-\d{2}-\d")
+_NM_PEAK_RE = re.compile(r"(\d+(?:\.\d+)?)\s*nm", re.I)
+_MZ_PEAK_RE = re.compile(r"(\d+(?:\.\d+)?)\s*m\/?z", re.I)
+
 # ---------------------------------------------------------------------------
 # Prompt manager ------------------------------------------------------------
 # ---------------------------------------------------------------------------
@@ -120,7 +127,7 @@ class SummaryGenerator:
     def _extract_json_summary(self, txt: str) -> str:
         """Extract summary value from the first JSON object containing the key `summary`."""
         # Locate the first brace that starts a JSON object
-        json_match = re.search(r"\{[^{}]*?\"summary\"[^{}]*?\}", txt, flags=re.S)
+        json_match = _SUMMARY_JSON_RE.search(txt)
         if json_match:
             block = json_match.group(0)
             try:
@@ -230,7 +237,6 @@ class SummaryGenerator:
     # ---------------------------------------------------------------------
     def _build_attrs(self, data: Dict[str, Any]) -> Dict[str, str]:
         from typing import Optional, Any, Dict
-        import re
 
         names   = data.get("names", {})
         safety  = data.get("safety", {})
@@ -266,7 +272,7 @@ class SummaryGenerator:
         # Alias tag
         synonyms = [
             s for s in names.get("synonyms", [])
-            if not re.fullmatch(r"\d{2,7}-\d{2}-\d", s)
+            if not _CAS_RE.fullmatch(s)
             and s.lower() != preferred.lower()
         ]
         unique_syn = list(dict.fromkeys(synonyms))
@@ -330,10 +336,10 @@ class SummaryGenerator:
                     text = seg.get("String", "")
                     # Captura *todos* los números con unidad nm o m/z
                     nm_peaks.extend(
-                        float(v) for v in re.findall(r"(\d+(?:\.\d+)?)\s*nm", text, flags=re.I)
+                        float(v) for v in _NM_PEAK_RE.findall(text)
                     )
                     mz_peaks.extend(
-                        float(v) for v in re.findall(r"(\d+(?:\.\d+)?)\s*m\/?z", text, flags=re.I)
+                        float(v) for v in _MZ_PEAK_RE.findall(text)
                     )
 
         if nm_peaks:
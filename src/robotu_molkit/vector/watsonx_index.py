@@ -1,14 +1,17 @@
 
 # watsonx_index.py  –  streamlined, folder‑based ingestor
-import json
 import logging
 import re
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, BinaryIO, Deque, Dict, List, Optional
 
-from ibm_watsonx_ai import Credentials
-from ibm_watsonx_ai.foundation_models import Embeddings
-from robotu_molkit.constants import DEFAULT_EMBED_MODEL_ID, DEFAULT_WATSONX_AI_URL
+import numpy as np
+import orjson
+
+from robotu_molkit.constants import CACHE_DIR, DEFAULT_EMBED_MODEL_ID, DEFAULT_WATSONX_AI_URL, EMBED_BATCH_SIZE, EMBED_MAX_CONCURRENCY, SUMMARY_MAX_CONCURRENCY
+from robotu_molkit.search.embedding_client import WatsonxEmbeddingClient
 from robotu_molkit.vector.summary_generator import SummaryGenerator
 
 CID_RE = re.compile(r"(\d+)")          # captures digits in “pubchem_2519.json”
@@ -26,12 +29,13 @@ class WatsonxIndex:
         project_id: str,
         ibm_url: str = DEFAULT_WATSONX_AI_URL,
         model: str = DEFAULT_EMBED_MODEL_ID,
+        backend: str = "watsonx",
     ) -> None:
-        # Watsonx embedding client
-        self.embedder = Embeddings(
-            model_id=model,
-            credentials=Credentials(api_key=api_key, url=ibm_url),
-            project_id=project_id,
+        # Single shared watsonx embedding client (one IAM token / connection for the whole run);
+        # vectors are cached on disk by (model, summary text) so re-runs only embed new summaries
+        self.embed_client = WatsonxEmbeddingClient(
+            api_key=api_key, project_id=project_id, ibm_url=ibm_url, model=model,
+            cache_dir=CACHE_DIR / "embeddings", backend=backend,
         )
         # Generates the single “general” blurb; credentials auto‑loaded
         self.sg = SummaryGenerator()
@@ -44,14 +48,26 @@ class WatsonxIndex:
         parsed_dir: Path,
         out_dir: Path = Path("data/vectors"),
         pattern: str = "pubchem_*.json",
+        batch_size: int = EMBED_BATCH_SIZE,
+        max_concurrency: int = EMBED_MAX_CONCURRENCY,
+        summary_concurrency: int = SUMMARY_MAX_CONCURRENCY,
+        reuse_summaries: bool = True,
     ) -> Path:
         """
         • Scan `parsed_dir` for JSON files matching *pattern*.
         • For each file:
             1. Build a general summary.
-            2. Get its embedding vector.
-            3. Extract filterable metadata from the same parsed JSON.
-            4. Append one JSON line to <out_dir>/watsonx_vectors.jsonl
+            2. Extract filterable metadata from the same parsed JSON.
+        • Summaries are generated for up to *summary_concurrency* files at
+          once, since each is a network round trip to Granite.
+        • Each summary is saved next to its file as pubchem_<cid>.summary.txt
+          and, with *reuse_summaries*, reused while newer than the JSON; the
+          unchanged text then hits the embedding cache, so a re-run only
+          calls watsonx for new or updated molecules.
+        • Embed the summaries *batch_size* at a time, with up to
+          *max_concurrency* batches in flight in the background (overlapping
+          the next batch's summaries), and append one JSON line per molecule
+          to <out_dir>/watsonx_vectors.jsonl in input order.
         Returns the path to the resulting JSONL file.
         """
         files = list(parsed_dir.glob(pattern))
@@ -63,83 +79,41 @@ class WatsonxIndex:
         out_dir.mkdir(parents=True, exist_ok=True)
         jsonl_path = out_dir / "watsonx_vectors.jsonl"
 
-        with jsonl_path.open("w", encoding="utf-8") as sink:
-            for file_path in files:
-                cid = self._cid_from_filename(file_path)
-                if cid is None:
-                    logging.warning("Skipping file without CID in name: %s", file_path.name)
-                    continue
-
-                data = json.loads(file_path.read_text())
-
-                # 1) Summary
-                summary = self.sg.generate_general_summary(data)
-                if not summary:
-                    logging.warning("Empty summary for CID %s – skipped", cid)
-                    continue
-
-                # 2) Embedding
-                vector = self._embed(summary)
-                if vector is None:
+        pending: List[Dict[str, Any]] = []
+        in_flight: Deque[Future] = deque()
+        summaries: Deque[Future] = deque()
+
+        def drain(limit: int) -> None:
+            # Write finished batches in submission order, keeping at most *limit* outstanding
+            while len(in_flight) > limit:
+                self._write(in_flight.popleft().result(), sink)
+
+        def collect(limit: int) -> None:
+            # Batch finished records in file order, keeping at most *limit* summaries outstanding
+            nonlocal pending
+            while len(summaries) > limit:
+                record = summaries.popleft().result()
+                if record is None:
                     continue
+                pending.append(record)
+                if len(pending) >= batch_size:
+                    in_flight.append(embed_pool.submit(self._embed_records, pending))
+                    pending = []
+                    drain(max_concurrency)
+
+        # Granite summaries are generated *summary_concurrency* files at a time
+        # and embedding runs on separate threads; only this thread writes to the sink.
+        with jsonl_path.open("wb") as sink, \
+                ThreadPoolExecutor(max_workers=summary_concurrency) as summary_pool, \
+                ThreadPoolExecutor(max_workers=max_concurrency) as embed_pool:
+            for file_path in files:
+                summaries.append(summary_pool.submit(self._build_record, file_path, reuse_summaries))
+                collect(2 * summary_concurrency)
+            collect(0)
 
-                # 3) Metadata extraction
-                names  = data.get("names", {})
-                search  = data.get("search", {})
-                sol     = data.get("solubility", {})
-                safety  = data.get("safety", {})
-                thermo  = data.get("thermo", {})
-                meta    = data.get("meta", {})
-                spectra = data.get("spectra", {}).get("raw", {}) or {}
-                pka_vals = sol.get("pka", []) or []
-                structure = data.get("structure", []) or []
-
-                # 4) Expectra interpretation 
-                spectra_tag, notable_peak = self.sg.format_spectra_info(spectra)
-
-                record: Dict[str, Any] = {
-                    # identifiers & summary/vector
-                    "cid":      cid,
-                    "summary":  summary,
-                    "vector":   vector,
-                    "name": names.get("preferred", None),
-
-                    # search‐section fields
-                    "inchi":                search.get("inchi"),
-                    "inchikey":             search.get("inchikey"),
-                    "smiles":               search.get("smiles"),
-                    "molecular_weight":     search.get("molecular_weight"),
-                    "formula":              search.get("formula"),
-                    "heavy_atom_count":     search.get("heavy_atom_count"),
-                    "hbond_donors":         search.get("hbond_donors"),
-                    "hbond_acceptors":      search.get("hbond_acceptors"),
-                    "rotatable_bonds":      search.get("rotatable_bonds"),
-                    "ring_count":           search.get("ring_count"),
-                    "aromatic_ring_count":  search.get("aromatic_ring_count"),
-                    "tpsa":                 search.get("tpsa"),
-                    "fsp3":                 search.get("fsp3"),
-                    "bertz_ct":             search.get("bertz_ct"),
-
-                    # fingerprint arrays
-                    "ecfp":  search.get("ecfp", []),
-                    "maccs": search.get("maccs", []),
-
-                    # quantitative metadata
-                    "logp":      sol.get("logp"),
-                    "logS":      sol.get("logs"),
-
-                    # qualitative tags
-                    "hazard_tag":     self.sg._qualitative_hazard(safety.get("ghs_codes", [])),
-                    "solubility_tag": self.sg._qualitative_sol(sol.get("logs")),
-                    "spectra_tag":    data.get("spectra", {}).get("raw", {}) and 
-                                        ", ".join(k.replace(" Spectra", "") for k in data["spectra"]["raw"].keys()) 
-                                        + " spectra available" 
-                                    or "no spectra available",
-                    "chem_tag":    meta.get("chem_tag", []),
-                    "ghs_codes":   safety.get("ghs_codes", []),
-                    "xyz": structure.get("xyz", []),
-                }
-                sink.write(json.dumps(record) + "\n")
+            if pending:
+                in_flight.append(embed_pool.submit(self._embed_records, pending))
+            drain(0)
 
         logging.info("Vector JSONL created → %s  (%d molecules)", jsonl_path, len(files))
         return jsonl_path
@@ -164,13 +138,108 @@ class WatsonxIndex:
         m = CID_RE.search(path.stem)
         return int(m.group(1)) if m else None
 
-    def _embed(self, text: str) -> Optional[List[float]]:
-        """
-        Return the embedding vector for a single text string.
-        """
+    def _build_record(self, file_path: Path, reuse_summary: bool = True) -> Optional[Dict[str, Any]]:
+        """Summary plus filterable metadata for one parsed file; None if it is skipped."""
+        cid = self._cid_from_filename(file_path)
+        if cid is None:
+            logging.warning("Skipping file without CID in name: %s", file_path.name)
+            return None
+
+        data = orjson.loads(file_path.read_bytes())
+
+        # 1) Summary (reused from a previous run when still current)
+        summary_path = file_path.with_suffix(".summary.txt")
+        summary = self._cached_summary(file_path, summary_path) if reuse_summary else None
+        if summary is None:
+            summary = self.sg.generate_general_summary(data)
+            if summary:
+                summary_path.write_text(summary, encoding="utf-8")
+        if not summary:
+            logging.warning("Empty summary for CID %s – skipped", cid)
+            return None
+
+        # 2) Metadata extraction
+        names  = data.get("names", {})
+        search  = data.get("search", {})
+        sol     = data.get("solubility", {})
+        safety  = data.get("safety", {})
+        thermo  = data.get("thermo", {})
+        meta    = data.get("meta", {})
+        pka_vals = sol.get("pka", []) or []
+        structure = data.get("structure", []) or []
+
+        record: Dict[str, Any] = {
+            # identifiers & summary/vector
+            "cid":      cid,
+            "summary":  summary,
+            "vector":   None,   # filled in by _embed_records
+            "name": names.get("preferred", None),
+
+            # search‐section fields
+            "inchi":                search.get("inchi"),
+            "inchikey":             search.get("inchikey"),
+            "smiles":               search.get("smiles"),
+            "molecular_weight":     search.get("molecular_weight"),
+            "formula":              search.get("formula"),
+            "heavy_atom_count":     search.get("heavy_atom_count"),
+            "hbond_donors":         search.get("hbond_donors"),
+            "hbond_acceptors":      search.get("hbond_acceptors"),
+            "rotatable_bonds":      search.get("rotatable_bonds"),
+            "ring_count":           search.get("ring_count"),
+            "aromatic_ring_count":  search.get("aromatic_ring_count"),
+            "tpsa":                 search.get("tpsa"),
+            "fsp3":                 search.get("fsp3"),
+            "bertz_ct":             search.get("bertz_ct"),
+
+            # packed fingerprints (hex)
+            "ecfp":  search.get("ecfp"),
+            "maccs": search.get("maccs"),
+
+            # quantitative metadata
+            "logp":      sol.get("logp"),
+            "logS":      sol.get("logs"),
+
+            # qualitative tags
+            "hazard_tag":     self.sg._qualitative_hazard(safety.get("ghs_codes", [])),
+            "solubility_tag": self.sg._qualitative_sol(sol.get("logs")),
+            "spectra_tag":    data.get("spectra", {}).get("raw", {}) and 
+                                ", ".join(k.replace(" Spectra", "") for k in data["spectra"]["raw"].keys()) 
+                                + " spectra available" 
+                            or "no spectra available",
+            "chem_tag":    meta.get("chem_tag", []),
+            "ghs_codes":   safety.get("ghs_codes", []),
+            "xyz": structure.get("xyz", []),
+        }
+        return record
+
+    @staticmethod
+    def _cached_summary(file_path: Path, summary_path: Path) -> Optional[str]:
+        """Saved summary for *file_path*, or None if missing or older than the file."""
         try:
-            # Watsonx expects a list of strings; take the first (and only) vector.
-            return self.embedder.embed_documents(texts=[text])[0]
-        except Exception as exc:          # pylint: disable=broad-except
-            logging.warning("Embedding error: %s", exc)
+            if summary_path.stat().st_mtime < file_path.stat().st_mtime:
+                return None
+            return summary_path.read_text(encoding="utf-8")
+        except FileNotFoundError:
             return None
+
+    def _embed(self, texts: List[str]) -> Optional[np.ndarray]:
+        """
+        Return a float32 array with one embedding row per text, in order, from a single request.
+        """
+        return self.embed_client.embed_batch(texts)
+
+    def _embed_records(self, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Fill in the vectors for a batch of records; returns [] if the batch failed."""
+        vectors = self._embed([r["summary"] for r in records])
+        if vectors is None:
+            logging.warning("Embedding batch failed; skipped %d molecules starting at CID %s", len(records), records[0]["cid"])
+            return []
+        for record, vector in zip(records, vectors):
+            record["vector"] = vector
+        return records
+
+    @staticmethod
+    def _write(records: List[Dict[str, Any]], sink: BinaryIO) -> None:
+        for record in records:
+            # Vectors are float32 rows; orjson writes them as JSON arrays
+            sink.write(orjson.dumps(record, option=orjson.OPT_SERIALIZE_NUMPY) + b"\n")
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+
+"""Tests for `robotu_molkit.molecule`."""
+
+import warnings
+
+import pytest
+
+from robotu_molkit.molecule import Molecule, Quantum, Spectra, Structure
+
+
+XYZ = [[0.0, 0.0, 0.0], [1.0, 0.0, 0.0], [0.0, 2.0, 0.0]]
+
+
+@pytest.fixture
+def molecule():
+    """Molecule with coordinates, per-atom and per-peak data set."""
+    return Molecule(
+        structure=Structure(xyz=XYZ, atom_symbols=["C", "O", "H"], bond_orders=[(0, 1, 2.0), (0, 2, 1.0)]),
+        quantum=Quantum(
+            mo_energies=[-10.0, -5.0, 1.5], homo_index=1,
+            mulliken_charges=[0.1, -0.2, 0.1], dipole_moment=(0.0, 1.2, 0.0),
+        ),
+        spectra=Spectra(ir_frequencies=[1700.0, 2900.0]),
+    )
+
+
+def test_structure_equality():
+    assert Structure(xyz=XYZ) == Structure(xyz=XYZ)
+    assert Structure(xyz=XYZ) != Structure(xyz=XYZ[:2])
+
+
+def test_json_round_trip(molecule):
+    restored = Molecule.from_json(molecule.to_json())
+    assert restored == molecule
+    assert restored.structure.xyz == [tuple(row) for row in XYZ]
+    assert restored.quantum.homo_lumo_gap == pytest.approx(6.5)
+
+
+def test_trusted_json_round_trip(molecule):
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")  # no serializer warnings on the rebuilt model
+        restored = Molecule.from_trusted_json(molecule.to_json())
+        assert restored.meta.fetched == molecule.meta.fetched
+        assert restored.to_json() == molecule.to_json()
+
+
+def test_json_schema_keeps_array_types():
+    xyz = Structure.model_json_schema()["properties"]["xyz"]
+    array = next(s for s in xyz["anyOf"] if s.get("type") == "array")
+    assert array["items"]["type"] == "array"
+    charges = Quantum.model_json_schema()["properties"]["mulliken_charges"]
+    assert {"type": "array", "items": {"type": "number"}} in charges["anyOf"]
+
+
+def test_distance_matrix():
+    np = pytest.importorskip("numpy")
+    d = Structure(xyz=XYZ).distance_matrix()
+    assert d.shape == (3, 3)
+    assert np.allclose(d, d.T)
+    assert d[0, 1] == pytest.approx(1.0)
+    assert d[1, 2] == pytest.approx(np.sqrt(5.0))
+
+
+def test_xyz_into():
+    np = pytest.importorskip("numpy")
+    out = np.full((5, 3), -1.0)
+    filled = Structure(xyz=XYZ).xyz_into(out)
+    assert filled.shape == (3, 3)
+    assert np.array_equal(out[:3], XYZ)
+    assert (out[3:] == -1.0).all()
+    assert Structure().xyz_into(out).shape == (0, 3)